@@ -0,0 +1,85 @@
+# admission.py
+import os
+import asyncio
+from contextlib import asynccontextmanager
+
+# --- Limits. Keep the summed concurrency below the threadpool size (40 by default) so
+# --- admitted requests never wait for a worker thread.
+EXTRACTION_MAX_CONCURRENCY = int(os.getenv("EXTRACTION_MAX_CONCURRENCY", "8"))
+EXTRACTION_MAX_QUEUE = int(os.getenv("EXTRACTION_MAX_QUEUE", "16"))
+VERIFICATION_MAX_CONCURRENCY = int(os.getenv("VERIFICATION_MAX_CONCURRENCY", "16"))
+VERIFICATION_MAX_QUEUE = int(os.getenv("VERIFICATION_MAX_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed instead of admitted."""
+
+    def __init__(self, name: str, reason: str, retry_after: int):
+        super().__init__(f"The {name} service is overloaded ({reason}). Please retry later.")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limits how many requests of one kind run at once. Excess requests wait in a bounded
+    queue; once the queue is full, or a request has waited too long, it is rejected.
+    All state is touched only from the event loop, so plain counters are safe.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @asynccontextmanager
+    async def admit(self):
+        # Counters are updated synchronously, unlike the semaphore, which wait_for acquires in a task.
+        if self.in_flight + self.queued >= self.max_concurrency + self.max_queue:
+            self.rejected_queue_full += 1
+            raise OverloadedError(self.name, "queue full", self.retry_after)
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            raise OverloadedError(self.name, "queue wait timed out", self.retry_after)
+        finally:
+            self.queued -= 1
+
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def metrics(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout
+        }
+
+
+extraction_admission = AdmissionController(
+    "extraction", EXTRACTION_MAX_CONCURRENCY, EXTRACTION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER
+)
+verification_admission = AdmissionController(
+    "verification", VERIFICATION_MAX_CONCURRENCY, VERIFICATION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER
+)
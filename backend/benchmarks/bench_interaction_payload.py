@@ -0,0 +1,106 @@
+# benchmarks/bench_interaction_payload.py
+"""
+Compares the three ways drug_api can decode an RxNav interaction/list.json payload:
+streaming with ijson, a full decode with orjson, and a full decode with the stdlib.
+
+Run from the backend directory:
+    python benchmarks/bench_interaction_payload.py --pairs 20000 --repeat 5
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import drug_api
+
+
+def build_payload(pair_count: int) -> bytes:
+    """Builds an interaction/list.json body shaped like RxNav's, with pair_count interaction pairs."""
+    def concept(rxcui):
+        return {
+            "minConceptItem": {"rxcui": str(rxcui), "name": f"drug{rxcui}", "tty": "IN"},
+            "sourceConceptItem": {"id": f"DB{rxcui:05d}", "name": f"Drug {rxcui}", "url": f"https://go.drugbank.com/drugs/DB{rxcui:05d}"}
+        }
+
+    types = []
+    for start in range(0, pair_count, 50):
+        pairs = [
+            {
+                "interactionConcept": [concept(index), concept(index + 1)],
+                "severity": "N/A",
+                "description": f"Drug {index} may increase the anticoagulant activities of Drug {index + 1}."
+            }
+            for index in range(start, min(start + 50, pair_count))
+        ]
+        types.append({"comment": "Drug1 (rxcui = 1, name = drug1, tty = IN).", "interactionPair": pairs})
+    payload = {
+        "nlmDisclaimer": "It is not the intention of NLM to provide specific medical advice.",
+        "fullInteractionTypeGroup": [{"sourceDisclaimer": "DrugBank is intended for educational use.", "sourceName": "DrugBank", "fullInteractionType": types}]
+    }
+    return json.dumps(payload).encode()
+
+class _FakeResponse:
+    """Just enough of requests.Response for drug_api._iter_interaction_pairs."""
+
+    def __init__(self, body: bytes):
+        self.content = body
+        self.raw = io.BytesIO(body)
+        # No Content-Length, so drug_api streams whenever ijson is enabled.
+        self.headers = {}
+
+@contextmanager
+def _decoder(name: str):
+    """Disables the optional libraries so drug_api takes the requested path."""
+    saved = (drug_api.ijson, drug_api.orjson)
+    if name != "ijson":
+        drug_api.ijson = None
+    if name == "stdlib":
+        drug_api.orjson = None
+    try:
+        yield
+    finally:
+        drug_api.ijson, drug_api.orjson = saved
+
+def _decode(body: bytes) -> int:
+    pairs = [drug_api._parse_interaction_pair(pair) for pair in drug_api._iter_interaction_pairs(_FakeResponse(body))]
+    return len(pairs)
+
+def measure(name: str, body: bytes, repeat: int) -> dict:
+    with _decoder(name):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            count = _decode(body)
+            timings.append(time.perf_counter() - started)
+
+        # Measured separately: tracemalloc slows allocation down and would skew the timings.
+        # It only sees Python allocations, so ijson's C parser buffers are not counted.
+        tracemalloc.start()
+        _decode(body)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"pairs": count, "best_ms": min(timings) * 1000, "peak_mib": peak / 2 ** 20}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=20000, help="interaction pairs in the synthetic payload")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per decoder; the best is reported")
+    args = parser.parse_args()
+
+    body = build_payload(args.pairs)
+    print(f"Payload: {args.pairs} pairs, {len(body) / 2 ** 20:.1f} MiB")
+    available = {"ijson": drug_api.ijson is not None, "orjson": drug_api.orjson is not None, "stdlib": True}
+    for name, is_available in available.items():
+        if not is_available:
+            print(f"{name:>7}: not installed, skipped")
+            continue
+        result = measure(name, body, args.repeat)
+        print(f"{name:>7}: {result['best_ms']:8.1f} ms  peak {result['peak_mib']:6.1f} MiB  ({result['pairs']} pairs)")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,132 @@
+# dosage_reference.py
+import os
+import re
+import json
+from typing import NamedTuple, Optional
+from drug_normalizer import normalize_drug_name, is_modified_release
+
+# Age-banded adult dosing ranges. Paediatric doses are weight-based, so they are left to the LLM.
+DOSAGE_REFERENCE_PATH = os.getenv("DOSAGE_REFERENCE_PATH", os.path.join(os.path.dirname(__file__), "data", "dosage_reference.json"))
+# A daily total above this fraction of the maximum is borderline and goes to the LLM.
+BORDERLINE_FRACTION = float(os.getenv("DOSAGE_BORDERLINE_FRACTION", "0.9"))
+
+UNIT_ALIASES = {"mg": "mg", "mcg": "mcg", "\u00b5g": "mcg", "ug": "mcg", "g": "g", "ml": "ml", "iu": "iu", "unit": "units", "units": "units"}
+# Factors to milligrams for the units that can be converted into one another.
+MASS_IN_MG = {"mg": 1.0, "g": 1000.0, "mcg": 0.001}
+
+AMOUNT_PATTERN = re.compile(r"(?:(\d+)\s*[x\u00d7]\s*)?(\d*\.\d+|\d+)\s*(mg|mcg|\u00b5g|ug|g|ml|iu|units?)(?![a-z])", re.IGNORECASE)
+# Optional "a day" / "per day" / "daily" tail after a count of doses.
+_PER_DAY = r"(?:\s*(?:a|per|/)\s*day|\s+daily)"
+FREQUENCY_PATTERNS = [
+    (re.compile(r"\b(?:q\s*|every\s+)(\d+(?:\.\d+)?)\s*(?:h|hr|hrs|hours?)\b"), lambda m: 24 / float(m.group(1))),
+    (re.compile(r"\b(\d+)\s*(?:x|times)" + _PER_DAY + r"\b"), lambda m: float(m.group(1))),
+    (re.compile(r"\b(?:four times" + _PER_DAY + r"?|qid|qds)\b"), lambda m: 4.0),
+    (re.compile(r"\b(?:three times" + _PER_DAY + r"?|thrice" + _PER_DAY + r"?|tid|tds)\b"), lambda m: 3.0),
+    (re.compile(r"\b(?:twice" + _PER_DAY + r"?|two times" + _PER_DAY + r"?|bid|bd)\b"), lambda m: 2.0),
+    (re.compile(r"\b(?:once" + _PER_DAY + r"|daily|every day|od|qd|qhs|nightly|at bedtime|every morning|every night)\b"), lambda m: 1.0)
+]
+# Words that carry no dosing information and may be left over after parsing. A "." next to a
+# digit is part of a number the patterns did not take in, so it is not filler.
+FILLER_PATTERN = re.compile(r"\b(?:take|by mouth|orally|po)\b|[,;]|(?<!\d)\.(?!\d)")
+
+
+class ParsedDose(NamedTuple):
+    amount: float
+    unit: str
+    frequency_per_day: Optional[float] = None
+    # False when part of the string was not understood (tablet counts, ranges, weekly or PRN schedules...).
+    complete: bool = True
+
+
+def parse_dose(dosage: str) -> Optional[ParsedDose]:
+    """
+    Parses strings like "500mg", "2 x 500 mg twice daily" or "10 mg q8h" into amount per
+    dose, unit and doses per day. Returns None if no amount with a unit can be found; the
+    result is marked incomplete if any other part of the string could not be parsed.
+    """
+    text = " ".join(dosage.lower().split())
+    match = AMOUNT_PATTERN.search(text)
+    if not match:
+        return None
+    count = int(match.group(1)) if match.group(1) else 1
+    amount = count * float(match.group(2))
+    unit = UNIT_ALIASES[match.group(3).lower()]
+    remaining = text[:match.start()] + " " + text[match.end():]
+
+    frequency = None
+    for pattern, to_frequency in FREQUENCY_PATTERNS:
+        frequency_match = pattern.search(remaining)
+        if frequency_match:
+            frequency = to_frequency(frequency_match)
+            remaining = remaining[:frequency_match.start()] + " " + remaining[frequency_match.end():]
+            break
+
+    complete = not FILLER_PATTERN.sub(" ", remaining).strip()
+    return ParsedDose(amount, unit, frequency, complete)
+
+def _convert(amount: float, unit: str, target_unit: str) -> Optional[float]:
+    if unit == target_unit:
+        return amount
+    if unit in MASS_IN_MG and target_unit in MASS_IN_MG:
+        return amount * MASS_IN_MG[unit] / MASS_IN_MG[target_unit]
+    return None
+
+def _load_reference() -> dict:
+    try:
+        with open(DOSAGE_REFERENCE_PATH, encoding="utf-8") as reference_file:
+            return json.load(reference_file)
+    except (OSError, ValueError) as e:
+        print(f"Could not load the dosage reference table from '{DOSAGE_REFERENCE_PATH}': {e}")
+        return {}
+
+DOSAGE_REFERENCE = _load_reference()
+
+
+def _format_amount(amount: float) -> str:
+    return f"{amount:g}"
+
+def _format_age_band(band: dict) -> str:
+    if band["max_age"] >= 120:
+        return f"aged {band['min_age']} and over"
+    return f"aged {band['min_age']}-{band['max_age']}"
+
+def check_dosage_locally(age: int, drug: str, dosage: str) -> Optional[str]:
+    """
+    Answers from the local reference table when a dose is fully parsed and clearly within the
+    usual range for the patient's age band. Without a frequency only the single dose is judged
+    and the answer states the daily maximum. Returns None for anything
+    else (out of the table, partly understood, out of range or borderline), so the caller
+    can ask the LLM instead. Modified-release products are never answered locally: the table
+    only holds immediate-release limits.
+    """
+    if is_modified_release(drug):
+        return None
+    bands = DOSAGE_REFERENCE.get(normalize_drug_name(drug))
+    parsed = parse_dose(dosage)
+    if not bands or parsed is None or not parsed.complete:
+        return None
+
+    band = next((band for band in bands if band["min_age"] <= age <= band["max_age"]), None)
+    if band is None:
+        return None
+
+    unit = band["unit"]
+    amount = _convert(parsed.amount, parsed.unit, unit)
+    if amount is None or not band["min_single"] <= amount <= band["max_single"]:
+        return None
+
+    if parsed.frequency_per_day is None:
+        daily_note = f"No schedule was given; do not exceed {_format_amount(band['max_daily'])} {unit} in total per day."
+    else:
+        daily_total = amount * parsed.frequency_per_day
+        if daily_total > band["max_daily"] * BORDERLINE_FRACTION:
+            return None
+        daily_note = f"The stated schedule gives {_format_amount(daily_total)} {unit} per day, below the maximum of {_format_amount(band['max_daily'])} {unit}."
+
+    return (
+        f"Conclusion: {dosage} is within the usual range. "
+        f"The typical single dose of {drug} for patients {_format_age_band(band)} is "
+        f"{_format_amount(band['min_single'])}-{_format_amount(band['max_single'])} {unit}. {daily_note} "
+        "(Source: local dosage reference table.) "
+        "Disclaimer: This is not medical advice. Consult a healthcare provider about individual dosing."
+    )
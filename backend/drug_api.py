@@ -1,8 +1,89 @@
+import os
+import json
+import sys
 import requests
-from typing import Optional, List
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Iterator, Set, Tuple
+from tracing import span, traced, set_attribute, in_current_context
+from drug_normalizer import normalize_drug_name
+from cache import LRUCache
+
+# Optional fast-path JSON libraries. orjson decodes whole payloads several times
+# faster than the stdlib, and ijson lets us stream just the interaction pairs out
+# of large RxNav responses without materialising the full document.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 BASE_URL = "https://rxnav.nlm.nih.gov/REST"
 
+# Everything fetching or decoding an interaction list can raise. Streaming reads response.raw
+# directly, so urllib3 errors arrive without the requests wrapper, and ijson has its own errors.
+INTERACTION_FETCH_ERRORS = (requests.exceptions.RequestException, urllib3.exceptions.HTTPError, ValueError, KeyError, IndexError)
+if ijson is not None:
+    INTERACTION_FETCH_ERRORS += (ijson.JSONError,)
+
+# Path to the individual interaction pairs inside an interaction/list.json payload.
+INTERACTION_PAIR_PREFIX = "fullInteractionTypeGroup.item.fullInteractionType.item.interactionPair.item"
+# Bodies at least this large (by Content-Length, or of unknown length) are streamed with ijson.
+# Smaller ones decode faster in one go with orjson; see benchmarks/bench_interaction_payload.py.
+INTERACTION_STREAM_MIN_BYTES = int(os.getenv("INTERACTION_STREAM_MIN_BYTES", str(8 * 1024 * 1024)))
+
+# --- Polypharmacy mode: lists longer than the threshold are checked in overlapping chunks ---
+POLYPHARMACY_THRESHOLD = int(os.getenv("POLYPHARMACY_THRESHOLD", "10"))
+POLYPHARMACY_BLOCK_SIZE = int(os.getenv("POLYPHARMACY_BLOCK_SIZE", "5"))
+POLYPHARMACY_MAX_WORKERS = int(os.getenv("POLYPHARMACY_MAX_WORKERS", "8"))
+# Block pairs grow quadratically with the drug count; past this many chunks the blocks are enlarged instead.
+POLYPHARMACY_MAX_CHUNKS = int(os.getenv("POLYPHARMACY_MAX_CHUNKS", "15"))
+
+# RxCUIs keyed by canonical drug name, so every spelling of a drug shares one lookup.
+_rxcui_cache = LRUCache(maxsize=4096, ttl=24 * 60 * 60)
+
+# Lower rank sorts first. Anything not listed (e.g. "N/A") sorts after these.
+SEVERITY_RANK = {"high": 0, "major": 0, "moderate": 1, "medium": 1, "low": 2, "minor": 2}
+
+
+def _rxnav_get(url: str, operation: str, **kwargs) -> requests.Response:
+    """GETs an RxNav URL inside a span so each lookup step shows up in traces."""
+    with span(f"rxnav.{operation}", url=url) as current:
+        response = requests.get(url, **kwargs)
+        current["attributes"]["status_code"] = response.status_code
+        return response
+
+def _json_loads(raw: bytes):
+    """Decodes a JSON payload, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _should_stream(response: requests.Response) -> bool:
+    if ijson is None:
+        return False
+    content_length = response.headers.get("Content-Length", "")
+    return not content_length.isdigit() or int(content_length) >= INTERACTION_STREAM_MIN_BYTES
+
+def _iter_interaction_pairs(response: requests.Response) -> Iterator[dict]:
+    """
+    Yields each 'interactionPair' object from an interaction/list.json response.
+    Large bodies are streamed with ijson when available; the rest are decoded in one go.
+    """
+    if _should_stream(response):
+        response.raw.decode_content = True
+        yield from ijson.items(response.raw, INTERACTION_PAIR_PREFIX)
+        return
+
+    data = _json_loads(response.content)
+    for group in data.get('fullInteractionTypeGroup', []):
+        for interaction_type in group.get('fullInteractionType', []):
+            yield from interaction_type.get('interactionPair', [])
+
 def _find_best_rxcui_from_candidates(candidates: list, drug_name: str) -> Optional[str]:
     """Helper function to parse a list of candidates and find the best RxCUI."""
     if not candidates:
@@ -33,12 +114,14 @@ def _find_best_rxcui_from_candidates(candidates: list, drug_name: str) -> Option
     
     return None
 
+@traced("drug_api.get_rxcui")
 def get_rxcui(drug_name: str, depth=0) -> Optional[str]:
     """
     Gets the RxNorm Concept Unique Identifier (RxCUI) using an even more resilient, multi-step search.
     """
     if depth > 2: # Prevents infinite recursion
         return None
+    set_attribute("drug", drug_name)
         
     print(f"--- Starting FINAL resilient search for drug: '{drug_name}' ---")
     
@@ -46,7 +129,7 @@ def get_rxcui(drug_name: str, depth=0) -> Optional[str]:
     try:
         print("Step 1: Attempting to find the core ingredient via getDrugs...")
         url = f"{BASE_URL}/drugs.json?name={drug_name}"
-        response = requests.get(url, timeout=10)
+        response = _rxnav_get(url, "drugs", timeout=10)
         if response.status_code == 200:
             data = response.json()
             drug_groups = data.get('drugGroup', {}).get('conceptGroup')
@@ -67,7 +150,7 @@ def get_rxcui(drug_name: str, depth=0) -> Optional[str]:
     try:
         print("Step 2: Falling back to approximate (fuzzy) search...")
         url = f"{BASE_URL}/approximateTerm.json?term={drug_name}&maxEntries=4"
-        response = requests.get(url, timeout=10)
+        response = _rxnav_get(url, "approximateTerm", timeout=10)
         if response.status_code == 200:
             data = response.json()
             candidates = data.get('approximateGroup', {}).get('candidate')
@@ -84,7 +167,7 @@ def get_rxcui(drug_name: str, depth=0) -> Optional[str]:
     try:
         print("Step 3: Checking for spelling suggestions...")
         url = f"{BASE_URL}/spellingsuggestions.json?name={drug_name}"
-        response = requests.get(url, timeout=5)
+        response = _rxnav_get(url, "spellingsuggestions", timeout=5)
         if response.status_code == 200:
             data = response.json()
             suggestions = data.get('suggestionGroup', {}).get('suggestionList', {}).get('suggestion')
@@ -99,50 +182,180 @@ def get_rxcui(drug_name: str, depth=0) -> Optional[str]:
     print(f"--- FINAL resilient search FAILED for drug: '{drug_name}' ---")
     return None
 
-def get_interactions(drug_list: List[str]) -> List[dict]:
-    """Gets interactions for a list of drug names."""
-    print("\n--- Starting Drug Interaction Check ---")
-    rxcuis = [rxcui for drug in drug_list if (rxcui := get_rxcui(drug))]
-    
+def _cached_or_fetched_rxcui(key: str, query: str, drug_name: str) -> Optional[str]:
+    rxcui = _rxcui_cache.get(key)
+    if rxcui is not None:
+        print(f"Using cached RxCUI {rxcui} for '{drug_name}' (looked up as '{key}').")
+        return rxcui
+    rxcui = get_rxcui(query)
+    if rxcui:
+        _rxcui_cache.set(key, rxcui)
+    return rxcui
+
+def lookup_rxcui(drug_name: str) -> Optional[str]:
+    """
+    Resolves a drug name via its canonical form, caching successful lookups. Normalization
+    can drop part of a name ("Omega 3", "Novolin 70/30"), so if the canonical form does not
+    resolve, the name as typed (whitespace-folded) is tried and cached under its own key.
+    """
+    canonical = normalize_drug_name(drug_name)
+    rxcui = _cached_or_fetched_rxcui(canonical, canonical, drug_name)
+    folded = " ".join(drug_name.split())
+    if not rxcui and folded.lower() != canonical:
+        print(f"Canonical name '{canonical}' did not resolve; retrying as typed: '{folded}'.")
+        rxcui = _cached_or_fetched_rxcui(folded.lower(), folded, drug_name)
+    return rxcui
+
+@traced("drug_api.resolve_rxcuis")
+def resolve_rxcuis(drug_list: List[str]) -> dict:
+    """Resolves each drug name to its RxCUI. Names that cannot be resolved map to None."""
+    return {drug: lookup_rxcui(drug) for drug in drug_list}
+
+def _parse_interaction_pair(pair: dict) -> dict:
+    return {
+        "drugs_involved": [
+            pair['interactionConcept'][0]['minConceptItem']['name'],
+            pair['interactionConcept'][1]['minConceptItem']['name']
+        ],
+        # Kept so callers can drop pairs when a drug is removed; not part of the API response.
+        "rxcuis": [
+            pair['interactionConcept'][0]['minConceptItem']['rxcui'],
+            pair['interactionConcept'][1]['minConceptItem']['rxcui']
+        ],
+        "severity": pair['severity'],
+        "description": pair['description']
+    }
+
+def _fetch_interaction_list(rxcuis: List[str]) -> List[dict]:
+    """Queries interaction/list.json for one set of RxCUIs. Raises on network or payload errors."""
+    url = f"{BASE_URL}/interaction/list.json?rxcuis={'+'.join(rxcuis)}"
+    # Closing the response releases the streamed connection even if decoding fails halfway.
+    with _rxnav_get(url, "interaction_list", timeout=15, stream=True) as response:
+        response.raise_for_status()
+        return [_parse_interaction_pair(pair) for pair in _iter_interaction_pairs(response)]
+
+def _overlapping_chunks(rxcuis: List[str], block_size: int, max_chunks: int = POLYPHARMACY_MAX_CHUNKS) -> List[List[str]]:
+    """
+    Splits the list into blocks and pairs every two blocks into one chunk, so each
+    pair of drugs appears together in at least one chunk. k blocks give k*(k-1)/2
+    chunks, so the block size grows until that stays within max_chunks.
+    """
+    while True:
+        block_count = -(-len(rxcuis) // block_size)
+        if block_count * (block_count - 1) // 2 <= max(max_chunks, 1):
+            break
+        block_size += 1
+    blocks = [rxcuis[i:i + block_size] for i in range(0, len(rxcuis), block_size)]
+    if len(blocks) == 1:
+        return blocks
+    return [blocks[i] + blocks[j] for i in range(len(blocks)) for j in range(i + 1, len(blocks))]
+
+def _get_interactions_chunked(rxcuis: List[str], only_involving: Optional[Set[str]] = None) -> Tuple[List[dict], bool]:
+    """
+    Fetches overlapping chunks concurrently and merges them; a failed chunk does not fail the rest.
+    With only_involving, chunks that contain none of those RxCUIs are skipped.
+    Returns the merged interactions and whether every chunk succeeded.
+    """
+    if only_involving:
+        # Placing the required RxCUIs first packs them into as few blocks, and so chunks, as possible.
+        rxcuis = sorted(rxcuis, key=lambda rxcui: rxcui not in only_involving)
+    chunks = _overlapping_chunks(rxcuis, POLYPHARMACY_BLOCK_SIZE)
+    if only_involving:
+        chunks = [chunk for chunk in chunks if not only_involving.isdisjoint(chunk)]
+    print(f"Polypharmacy mode: checking {len(rxcuis)} RxCUIs in {len(chunks)} overlapping chunks.")
+    set_attribute("chunk_count", len(chunks))
+
+    with ThreadPoolExecutor(max_workers=min(POLYPHARMACY_MAX_WORKERS, len(chunks))) as executor:
+        futures = [executor.submit(in_current_context(_fetch_interaction_list), chunk) for chunk in chunks]
+
+    results = []
+    seen = set()
+    failed_chunks = 0
+    for chunk, future in zip(chunks, futures):
+        try:
+            chunk_results = future.result()
+        except INTERACTION_FETCH_ERRORS as e:
+            failed_chunks += 1
+            print(f"Error fetching interactions for chunk {'+'.join(chunk)}: {e}")
+            continue
+        # Pairs inside one block come back from every chunk containing that block.
+        for interaction in chunk_results:
+            key = (frozenset(interaction['rxcuis']), interaction['severity'], interaction['description'])
+            if key not in seen:
+                seen.add(key)
+                results.append(interaction)
+
+    if failed_chunks:
+        print(f"WARNING: {failed_chunks} of {len(chunks)} chunks failed; the interaction check is incomplete.")
+        set_attribute("failed_chunks", failed_chunks)
+    return results, failed_chunks == 0
+
+@traced("drug_api.get_interactions")
+def get_interactions_for_rxcuis(rxcuis: List[str], only_involving: Optional[Set[str]] = None) -> Tuple[List[dict], bool]:
+    """
+    Gets interactions between already-resolved RxCUIs, or with only_involving, just the
+    pairs that include one of those RxCUIs. Returns the interactions and whether the check
+    completed; on a failed request (or failed chunk) the list may be missing pairs.
+    """
+    set_attribute("rxcui_count", len(rxcuis))
     if len(rxcuis) < 2:
         print("Fewer than two valid drug RxCUIs found. Skipping interaction check.")
         print("-------------------------------------\n")
-        return []
+        return [], True
 
-    rxcui_str = "+".join(rxcuis)
-    print(f"Checking interactions for RxCUIs: {rxcui_str}")
-    url = f"{BASE_URL}/interaction/list.json?rxcuis={rxcui_str}"
-    
     try:
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        data = response.json()
-        
-        if 'fullInteractionTypeGroup' not in data:
+        if len(rxcuis) > POLYPHARMACY_THRESHOLD:
+            results, complete = _get_interactions_chunked(rxcuis, only_involving)
+        else:
+            print(f"Checking interactions for RxCUIs: {'+'.join(rxcuis)}")
+            results, complete = _fetch_interaction_list(rxcuis), True
+        if only_involving:
+            results = [item for item in results if not only_involving.isdisjoint(item['rxcuis'])]
+
+        if not results:
             print("No interaction data returned from API.")
             print("-------------------------------------\n")
-            return []
-
-        results = []
-        for group in data['fullInteractionTypeGroup']:
-            for interaction_type in group['fullInteractionType']:
-                for pair in interaction_type['interactionPair']:
-                    interaction_details = {
-                        "drugs_involved": [
-                            pair['interactionConcept'][0]['minConceptItem']['name'],
-                            pair['interactionConcept'][1]['minConceptItem']['name']
-                        ],
-                        "severity": pair['severity'],
-                        "description": pair['description']
-                    }
-                    results.append(interaction_details)
-        
+            return [], complete
+
         print(f"Found {len(results)} interactions.")
         print("-------------------------------------\n")
-        return results
+        return results, complete
         
-    except requests.exceptions.RequestException as e:
+    except INTERACTION_FETCH_ERRORS as e:
         print(f"Error fetching interactions from API: {e}")
         print("-------------------------------------\n")
-        return []
+        set_attribute("interaction_check_failed", True)
+        return [], False
+
+def get_interactions(drug_list: List[str]) -> List[dict]:
+    """Gets interactions for a list of drug names."""
+    print("\n--- Starting Drug Interaction Check ---")
+    rxcuis = [rxcui for rxcui in resolve_rxcuis(drug_list).values() if rxcui]
+    results, _ = get_interactions_for_rxcuis(rxcuis)
+    return results
+
+def _severity_rank(severity: str) -> int:
+    return SEVERITY_RANK.get((severity or "").strip().lower(), max(SEVERITY_RANK.values()) + 1)
+
+def compact_interactions(interactions: List[dict], limit: Optional[int] = None, offset: int = 0) -> Tuple[List[dict], int]:
+    """
+    Collapses duplicate and symmetric drug pairs (A & B == B & A), keeping the most
+    severe entry for each pair, then ranks the pairs by severity and returns one page.
+    Returns the page together with the total number of distinct pairs.
+    """
+    best_by_pair = {}
+    for interaction in interactions:
+        pair_key = frozenset(name.strip().lower() for name in interaction['drugs_involved'])
+        current = best_by_pair.get(pair_key)
+        if current is None or _severity_rank(interaction['severity']) < _severity_rank(current['severity']):
+            best_by_pair[pair_key] = {
+                **interaction,
+                "severity": sys.intern(interaction['severity']),
+                # Sources repeat the same descriptions verbatim; intern them so each is stored once.
+                "description": sys.intern(interaction['description'])
+            }
 
+    # sorted() is stable, so pairs of equal severity keep the order RxNav returned them in.
+    ranked = sorted(best_by_pair.values(), key=lambda item: _severity_rank(item['severity']))
+    end = None if limit is None else offset + limit
+    return ranked[offset:end], len(ranked)
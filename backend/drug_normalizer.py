@@ -0,0 +1,96 @@
+# drug_normalizer.py
+import os
+import re
+import json
+from functools import lru_cache
+
+# Brand names and regional synonyms mapped to the generic names RxNorm indexes.
+DRUG_SYNONYMS_PATH = os.getenv("DRUG_SYNONYMS_PATH", os.path.join(os.path.dirname(__file__), "data", "drug_synonyms.json"))
+
+STRENGTH_PATTERN = re.compile(
+    r"\b\d+(?:[.,]\d+)?\s*(?:mg|mcg|\u00b5g|ug|g|ml|l|iu|units?|meq|mmol|%)"
+    r"(?:\s*/\s*\d*(?:\.\d+)?\s*(?:ml|l|g|dose|actuation|hr|h))?(?![a-z])",
+    re.IGNORECASE
+)
+PUNCTUATION_PATTERN = re.compile(r"[^a-z0-9\s/#-]")
+# "#3" in "Tylenol #3" is part of the product name, not a strength; a bare "#" is dropped.
+NUMBERED_PATTERN = re.compile(r"#\s*(\d*)")
+NUMBER_PATTERN = re.compile(r"^\d+(?:[.,]\d+)?$")
+
+DOSE_FORM_TOKENS = {
+    "tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules", "er", "xr", "sr", "cr", "dr", "xl",
+    "la", "ir", "ec", "odt", "oral", "po", "solution", "soln", "susp", "suspension", "syrup", "elixir", "injection",
+    "inj", "cream", "ointment", "gel", "patch", "drops", "inhaler", "spray", "chewable", "extended", "delayed",
+    "immediate", "release", "film", "coated", "enteric"
+}
+# Dose-form tokens marking a modified-release product. The canonical name drops them, but such
+# products have their own dosing limits, so dose checks need to know they were there.
+MODIFIED_RELEASE_TOKENS = {"er", "xr", "sr", "cr", "dr", "xl", "la", "extended", "delayed"}
+SALT_TOKENS = {
+    "hcl", "hydrochloride", "hydrobromide", "sodium", "potassium", "calcium", "magnesium", "besylate", "besilate",
+    "maleate", "mesylate", "tartrate", "succinate", "citrate", "sulfate", "sulphate", "phosphate", "acetate",
+    "fumarate", "dihydrate", "monohydrate", "trihydrate"
+}
+# A salt token right after one of these is part of the drug's name (e.g. "ferrous sulfate"), so it is kept.
+MINERAL_TOKENS = {"sodium", "potassium", "calcium", "magnesium", "ferrous", "ferric", "zinc", "lithium", "aluminum", "aluminium"}
+
+
+def _load_synonyms() -> dict:
+    try:
+        with open(DRUG_SYNONYMS_PATH, encoding="utf-8") as synonyms_file:
+            return {key.lower(): value.lower() for key, value in json.load(synonyms_file).items()}
+    except (OSError, ValueError) as e:
+        print(f"Could not load drug synonyms from '{DRUG_SYNONYMS_PATH}': {e}")
+        return {}
+
+SYNONYMS = _load_synonyms()
+
+
+def _strip_salts(tokens: list) -> list:
+    kept = tokens[:1]
+    for token in tokens[1:]:
+        if token in SALT_TOKENS and kept[-1] not in MINERAL_TOKENS:
+            continue
+        kept.append(token)
+    return kept
+
+def is_modified_release(name: str) -> bool:
+    """True if the name carries a modified-release marker ("Metformin ER", "Glucophage XR")."""
+    return not MODIFIED_RELEASE_TOKENS.isdisjoint(re.split(r"[\s/-]+", PUNCTUATION_PATTERN.sub(" ", name.lower())))
+
+def _normalize_component(tokens: list) -> str:
+    candidate = " ".join(tokens)
+    if candidate in SYNONYMS:
+        return SYNONYMS[candidate]
+
+    candidate = " ".join(_strip_salts(tokens))
+    return SYNONYMS.get(candidate, candidate)
+
+@lru_cache(maxsize=4096)
+def normalize_drug_name(name: str) -> str:
+    """
+    Reduces a drug name as typed or extracted ("Metformin HCl 500 mg tab", "  METFORMIN ER")
+    to one canonical form ("metformin") used for RxNorm lookups and as the key for every cache.
+    Combination products are normalized per ingredient and joined with " / ".
+    """
+    folded = " ".join(name.lower().split())
+    if not folded:
+        return folded
+
+    text = PUNCTUATION_PATTERN.sub(" ", STRENGTH_PATTERN.sub(" ", folded))
+    text = NUMBERED_PATTERN.sub(lambda match: f" #{match.group(1)}" if match.group(1) else " ", text)
+    components = [[token for token in part.split() if token not in DOSE_FORM_TOKENS] for part in text.split("/")]
+
+    # Bare numbers are usually strengths, but some brands are numbered ("tylenol 3"), so try those first.
+    candidate = " / ".join(" ".join(tokens) for tokens in components if tokens)
+    if candidate in SYNONYMS:
+        return SYNONYMS[candidate]
+
+    names = []
+    for tokens in components:
+        tokens = [token for token in tokens if not NUMBER_PATTERN.match(token)]
+        if tokens:
+            names.append(_normalize_component(tokens))
+    if not names:
+        return SYNONYMS.get(folded, folded)
+    return " / ".join(names)
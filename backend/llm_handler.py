@@ -1,91 +1,102 @@
 # llm_handler.py
 import os
-import requests
-import json
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# --- Load BOTH API Keys ---
-HF_API_TOKEN = os.getenv("HF_API_TOKEN")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-# --- Define BOTH Service Endpoints ---
-HF_API_URL = "https://api-inference.huggingface.co/models/BioMistral/BioMistral-7B"
-HF_HEADERS = {"Authorization": f"Bearer {HF_API_TOKEN}"}
-
-GOOGLE_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GOOGLE_API_KEY}"
-GOOGLE_HEADERS = {"Content-Type": "application/json"}
-
-
-def _query_huggingface(prompt: str) -> str | None:
-    """Attempts to query the Hugging Face API. Returns None on failure."""
-    if not HF_API_TOKEN:
-        print("Hugging Face token not found, skipping.")
-        return None
-    
-    payload = {
-        "inputs": f"[INST] {prompt} [/INST]",
-        "parameters": {"max_new_tokens": 250, "temperature": 0.5, "return_full_text": False}
-    }
-    try:
-        response = requests.post(HF_API_URL, headers=HF_HEADERS, json=payload, timeout=45)
-        if response.status_code == 200:
-            print("Successfully received response from Hugging Face.")
-            return response.json()[0]['generated_text'].strip()
-        else:
-            print(f"Hugging Face API returned an error: {response.status_code} - {response.text}")
-            return None # Signal failure
-    except requests.exceptions.RequestException as e:
-        print(f"A network error occurred while contacting Hugging Face: {e}")
-        return None # Signal failure
-
-def _query_google_ai(prompt: str) -> str:
-    """Queries the Google Gemini API as a reliable backup."""
-    if not GOOGLE_API_KEY:
-        return "ERROR: Google API Key is missing. Please configure your .env file."
-
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    try:
-        response = requests.post(GOOGLE_API_URL, headers=GOOGLE_HEADERS, json=payload, timeout=60)
-        response.raise_for_status()
-        data = response.json()
-        if 'candidates' in data and data['candidates']:
-            return data['candidates'][0]['content']['parts'][0]['text'].strip()
-        return "Received an unexpected response from Google AI."
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred while contacting Google AI: {e}")
-        return "An error occurred while communicating with the backup AI model."
-
-def query_llm_with_fallback(prompt: str) -> str:
+from concurrent.futures import ThreadPoolExecutor
+from cache import LRUCache
+from drug_normalizer import normalize_drug_name
+from dosage_reference import check_dosage_locally
+from llm_providers import generate_with_fallback, LLM_PROVIDER_ORDER, ALTERNATIVES_PROVIDER_ORDER
+from tracing import traced, set_attribute, in_current_context
+
+# --- Message returned when no model could answer. It is never cached. ---
+LLM_UNAVAILABLE_MESSAGE = "An error occurred while communicating with the AI models. Please check the configured LLM providers."
+LLM_FAILURE_MESSAGES = (LLM_UNAVAILABLE_MESSAGE,)
+
+# --- Alternative suggestions are fanned out per interacting pair and cached by pair ---
+ALTERNATIVES_MAX_WORKERS = int(os.getenv("ALTERNATIVES_MAX_WORKERS", "5"))
+_alternatives_cache = LRUCache(maxsize=512, ttl=24 * 60 * 60)
+
+# --- LLM dosage analyses are cached per drug, dose and age as written, since the answer echoes them ---
+_dosage_cache = LRUCache(maxsize=2048, ttl=24 * 60 * 60)
+
+
+def query_llm_with_fallback(prompt: str, order: str = LLM_PROVIDER_ORDER) -> str:
     """
-    Main function to query LLMs. First tries Hugging Face, falls back to Google AI on failure.
+    Main function to query LLMs. Tries each provider in the order string in turn
+    (by default LLM_PROVIDER_ORDER: local model, Hugging Face, Google Gemini).
     """
-    print("Attempting to use Hugging Face API...")
-    hf_response = _query_huggingface(prompt)
-    
-    if hf_response:
-        return hf_response
-    
-    print("Hugging Face API failed or is unavailable. Falling back to Google Gemini API.")
-    return _query_google_ai(prompt)
+    response = generate_with_fallback(prompt, order, max_new_tokens=250, temperature=0.5)
+    return response if response else LLM_UNAVAILABLE_MESSAGE
 
 
-# --- The functions called by main.py remain the same ---
-# They now use the new intelligent fallback system automatically.
+# --- The functions called by main.py ---
+# They use the configured provider chain automatically.
 
+@traced("llm_handler.analyze_dosage")
 def analyze_dosage_with_llm(age: int, drug: str, dosage: str) -> str:
-    """Asks the LLM to analyze if a dosage is appropriate for a given age."""
+    """
+    Analyzes if a dosage is appropriate for a given age. Doses clearly within the local
+    reference table's range are answered directly; everything else goes to the LLM, whose
+    answers are cached.
+    """
+    local_answer = check_dosage_locally(age, drug, dosage)
+    set_attribute("local_reference", local_answer is not None)
+    if local_answer is not None:
+        print(f"Answered dosage check for '{drug} {dosage}' from the local reference table.")
+        return local_answer
+
+    key = (" ".join(drug.lower().split()), " ".join(dosage.lower().split()), age)
+    cached = _dosage_cache.get(key)
+    set_attribute("cache_hit", cached is not None)
+    if cached is not None:
+        print(f"Using cached dosage analysis for '{drug} {dosage}'.")
+        return cached
+
     prompt = f"""
     You are a clinical AI assistant. Analyze if the dosage '{dosage}' for the drug '{drug}' is generally appropriate for a patient who is {age} years old.
     Provide a concise conclusion, a brief explanation based on known medical guidelines, and a clear disclaimer that this is not medical advice.
     """
-    return query_llm_with_fallback(prompt)
+    analysis = query_llm_with_fallback(prompt)
+    if analysis not in LLM_FAILURE_MESSAGES:
+        _dosage_cache.set(key, analysis)
+    return analysis
+
+def _pair_key(problem_drug: str, interacting_drug: str) -> tuple:
+    """Cache key for a suggestion. Ordered, because the prompt asks for an alternative to problem_drug only."""
+    return (normalize_drug_name(problem_drug), normalize_drug_name(interacting_drug))
 
+@traced("llm_handler.suggest_alternatives")
 def suggest_alternatives_with_llm(problem_drug: str, interacting_drug: str) -> str:
     """Asks the LLM to suggest safer alternatives."""
+    key = _pair_key(problem_drug, interacting_drug)
+    cached = _alternatives_cache.get(key)
+    set_attribute("cache_hit", cached is not None)
+    if cached is not None:
+        print(f"Using cached alternative suggestion for '{problem_drug}' & '{interacting_drug}'.")
+        return cached
+
     prompt = f"""
     You are a clinical AI assistant. A patient is taking '{interacting_drug}' which has a known harmful interaction with '{problem_drug}'.
     Suggest one common, safer alternative medication for '{problem_drug}' that belongs to a similar drug class but with a lower interaction risk. Explain your reasoning briefly.
     """
-    return query_llm_with_fallback(prompt)
\ No newline at end of file
+    suggestion = query_llm_with_fallback(prompt, ALTERNATIVES_PROVIDER_ORDER)
+    if suggestion not in LLM_FAILURE_MESSAGES:
+        _alternatives_cache.set(key, suggestion)
+    return suggestion
+
+def suggest_alternatives_for_pairs(pairs: list) -> list:
+    """
+    Suggests alternatives for every distinct (problem_drug, interacting_drug) pair.
+    Symmetric duplicates are collapsed and the LLM calls run concurrently, so the
+    whole batch costs roughly one round trip. Returns (problem, interacting, suggestion) tuples.
+    """
+    unique_pairs = {}
+    for problem_drug, interacting_drug in pairs:
+        unique_pairs.setdefault(frozenset(_pair_key(problem_drug, interacting_drug)), (problem_drug, interacting_drug))
+
+    if not unique_pairs:
+        return []
+
+    workers = min(ALTERNATIVES_MAX_WORKERS, len(unique_pairs))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(in_current_context(suggest_alternatives_with_llm), *pair) for pair in unique_pairs.values()]
+        return [(problem, interacting, future.result()) for (problem, interacting), future in zip(unique_pairs.values(), futures)]
\ No newline at end of file
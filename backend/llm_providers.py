@@ -0,0 +1,200 @@
+# llm_providers.py
+import os
+import threading
+from abc import ABC, abstractmethod
+import requests
+from dotenv import load_dotenv
+from tracing import span
+
+load_dotenv()
+
+HF_API_TOKEN = os.getenv("HF_API_TOKEN")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+HF_INFERENCE_URL = "https://api-inference.huggingface.co/models/"
+GOOGLE_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GOOGLE_API_KEY}"
+
+# --- Provider ordering. Unknown or unavailable providers in these lists are skipped. ---
+LLM_PROVIDER_ORDER = os.getenv("LLM_PROVIDER_ORDER", "local,biomistral,gemini")
+EXTRACTION_PROVIDER_ORDER = os.getenv("EXTRACTION_PROVIDER_ORDER", "local,granite,gemini")
+# Alternatives are generated for several pairs concurrently. The local model runs one generation
+# at a time, so it is left out by default to keep that fan-out parallel.
+ALTERNATIVES_PROVIDER_ORDER = os.getenv("ALTERNATIVES_PROVIDER_ORDER", "biomistral,gemini")
+
+# --- Local CPU inference (llama-cpp-python with a small quantized GGUF instruct model) ---
+LOCAL_LLM_MODEL_PATH = os.getenv("LOCAL_LLM_MODEL_PATH")
+LOCAL_LLM_CONTEXT = int(os.getenv("LOCAL_LLM_CONTEXT", "2048"))
+LOCAL_LLM_THREADS = int(os.getenv("LOCAL_LLM_THREADS", str(os.cpu_count() or 4)))
+
+
+class LLMProvider(ABC):
+    """Base class for a text-generation backend. generate() returns None on any failure."""
+    name = "base"
+
+    def is_available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def generate(self, prompt: str, max_new_tokens: int | None = None, temperature: float | None = None) -> str | None:
+        ...
+
+
+class HuggingFaceProvider(LLMProvider):
+    """A model served by the Hugging Face Inference API."""
+
+    def __init__(self, name: str, model_id: str, instruction_format: bool = False):
+        self.name = name
+        self.url = HF_INFERENCE_URL + model_id
+        self.instruction_format = instruction_format
+
+    def is_available(self) -> bool:
+        return bool(HF_API_TOKEN)
+
+    def generate(self, prompt, max_new_tokens=None, temperature=None):
+        inputs = f"[INST] {prompt} [/INST]" if self.instruction_format else prompt
+        parameters = {"return_full_text": False}
+        if max_new_tokens is not None:
+            parameters["max_new_tokens"] = max_new_tokens
+        if temperature is not None:
+            parameters["temperature"] = temperature
+        try:
+            response = requests.post(
+                self.url,
+                headers={"Authorization": f"Bearer {HF_API_TOKEN}"},
+                json={"inputs": inputs, "parameters": parameters},
+                timeout=45
+            )
+            if response.status_code == 200:
+                print(f"Successfully received response from Hugging Face ({self.name}).")
+                return response.json()[0]['generated_text'].strip()
+            print(f"Hugging Face ({self.name}) returned an error: {response.status_code} - {response.text}")
+            return None
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+            print(f"An error occurred while contacting Hugging Face ({self.name}): {e}")
+            return None
+
+
+class GoogleGeminiProvider(LLMProvider):
+    """Google's Gemini API."""
+    name = "gemini"
+
+    def is_available(self) -> bool:
+        return bool(GOOGLE_API_KEY)
+
+    def generate(self, prompt, max_new_tokens=None, temperature=None):
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        generation_config = {}
+        if max_new_tokens is not None:
+            generation_config["maxOutputTokens"] = max_new_tokens
+        if temperature is not None:
+            generation_config["temperature"] = temperature
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        try:
+            response = requests.post(GOOGLE_API_URL, headers={"Content-Type": "application/json"}, json=payload, timeout=60)
+            response.raise_for_status()
+            data = response.json()
+            if 'candidates' in data and data['candidates']:
+                print("Successfully received response from Google Gemini.")
+                return data['candidates'][0]['content']['parts'][0]['text'].strip()
+            print("Received an unexpected response from Google AI.")
+            return None
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+            print(f"An error occurred while contacting Google AI: {e}")
+            return None
+
+
+class LocalLlamaCppProvider(LLMProvider):
+    """
+    Runs a small quantized instruct model on the CPU via llama-cpp-python. The model is
+    loaded once on first use (or by warm_up()) and kept in memory for the process lifetime.
+    """
+    name = "local"
+
+    def __init__(self, model_path: str | None):
+        self.model_path = model_path
+        self._model = None
+        # llama.cpp contexts are not thread-safe, so loading and generation are serialized.
+        self._lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        if not self.model_path or not os.path.exists(self.model_path):
+            return False
+        try:
+            import llama_cpp  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _load(self):
+        if self._model is None:
+            from llama_cpp import Llama
+            print(f"Loading local model from '{self.model_path}'...")
+            self._model = Llama(model_path=self.model_path, n_ctx=LOCAL_LLM_CONTEXT, n_threads=LOCAL_LLM_THREADS, verbose=False)
+        return self._model
+
+    def warm_up(self) -> None:
+        with self._lock:
+            self._load()
+
+    def generate(self, prompt, max_new_tokens=None, temperature=None):
+        try:
+            with self._lock:
+                completion = self._load().create_chat_completion(
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=max_new_tokens or 256,
+                    temperature=0.2 if temperature is None else temperature
+                )
+            print("Successfully received response from the local model.")
+            return completion['choices'][0]['message']['content'].strip()
+        except Exception as e:
+            print(f"The local model failed to generate a response: {e}")
+            return None
+
+
+# --- Registry ---
+_providers = {}
+
+def register_provider(provider: LLMProvider) -> None:
+    """Registers (or replaces) a provider under its name."""
+    _providers[provider.name] = provider
+
+def get_provider(name: str) -> LLMProvider | None:
+    return _providers.get(name)
+
+def provider_chain(order: str) -> list:
+    """Returns the available providers named in a comma-separated order string."""
+    chain = []
+    for name in (part.strip() for part in order.split(",")):
+        provider = _providers.get(name)
+        if provider is None:
+            if name:
+                print(f"Unknown LLM provider '{name}' in configuration, skipping.")
+            continue
+        if provider.is_available():
+            chain.append(provider)
+    return chain
+
+def generate_with_fallback(prompt: str, order: str = LLM_PROVIDER_ORDER, **params) -> str | None:
+    """Tries each configured provider in order and returns the first successful response."""
+    for provider in provider_chain(order):
+        print(f"Attempting to use LLM provider '{provider.name}'...")
+        with span("llm.generate", provider=provider.name) as current:
+            text = provider.generate(prompt, **params)
+            current["attributes"]["success"] = bool(text)
+        if text:
+            return text
+        print(f"LLM provider '{provider.name}' failed or is unavailable.")
+    return None
+
+def warm_up_providers() -> None:
+    """Loads local models ahead of the first request so they are kept warm."""
+    for provider in _providers.values():
+        if hasattr(provider, "warm_up") and provider.is_available():
+            provider.warm_up()
+
+
+register_provider(LocalLlamaCppProvider(LOCAL_LLM_MODEL_PATH))
+register_provider(HuggingFaceProvider("biomistral", "BioMistral/BioMistral-7B", instruction_format=True))
+register_provider(HuggingFaceProvider("granite", "ibm-granite/granite-3.3-2b-instruct"))
+register_provider(GoogleGeminiProvider())
@@ -1,48 +1,254 @@
 # main.py
-from fastapi import FastAPI, HTTPException
-from typing import List
-from models import VerificationRequest, VerificationResponse, DrugInput
+import os
+import uuid
+import hashlib
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from typing import List, Optional
+
+from models import VerificationRequest, IncrementalVerificationRequest, VerificationResponse, DrugInput, ResultOptions
 from nlp_processor import extract_drug_info
-from drug_api import get_interactions
-from llm_handler import analyze_dosage_with_llm, suggest_alternatives_with_llm
+from drug_api import resolve_rxcuis, get_interactions_for_rxcuis, compact_interactions
+from llm_handler import analyze_dosage_with_llm, suggest_alternatives_for_pairs, LLM_FAILURE_MESSAGES
+from llm_providers import warm_up_providers
+from cache import LRUCache
+from drug_normalizer import normalize_drug_name
+from tracing import span, trace_request, set_attribute
+from admission import OverloadedError, extraction_admission, verification_admission
+
+# Alternatives are generated for at most this many of the most severe interacting pairs.
+MAX_ALTERNATIVE_PAIRS = int(os.getenv("MAX_ALTERNATIVE_PAIRS", "5"))
+
+# Verification state is kept per result token so that edits to a drug list can be re-verified incrementally.
+VERIFICATION_STATE_TTL = int(os.getenv("VERIFICATION_STATE_TTL", "3600"))
+_verification_states = LRUCache(maxsize=1024, ttl=VERIFICATION_STATE_TTL)
+
+# Each endpoint path is admitted through the controller for its kind of work.
+ADMISSION_BY_PATH = {
+    "/extract-from-text/": extraction_admission,
+    "/verify-prescription/": verification_admission,
+    "/verify-prescription/incremental/": verification_admission
+}
+
+# Whole responses are memoized by the prescription as submitted (see _request_key).
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+_response_cache = LRUCache(maxsize=2048, ttl=RESPONSE_CACHE_TTL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load any local model before the first request so it is kept warm.
+    warm_up_providers()
+    yield
 
 app = FastAPI(
     title="AI Medical Prescription Verification API",
-    description="An API to verify drug interactions, dosages, and suggest alternatives using online models."
+    description="An API to verify drug interactions, dosages, and suggest alternatives using online models.",
+    lifespan=lifespan
 )
 
+async def _is_memoized(request: Request) -> bool:
+    """True for a verification the response cache can answer (with a 200 or a 304) without upstream calls."""
+    if request.url.path != "/verify-prescription/":
+        return False
+    try:
+        verification = VerificationRequest.model_validate_json(await request.body())
+    except ValidationError:
+        return False
+    return _response_cache.get(_request_key(verification)) is not None
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """
+    Sheds load with a fast 503 instead of letting slow upstream calls pile up in the threadpool.
+    Requests served from the response cache are cheap, so they skip the queue.
+    """
+    controller = ADMISSION_BY_PATH.get(request.url.path)
+    if controller is None or await _is_memoized(request):
+        return await call_next(request)
+    try:
+        async with controller.admit():
+            return await call_next(request)
+    except OverloadedError as e:
+        return JSONResponse(status_code=503, content={"detail": str(e)}, headers={"Retry-After": str(e.retry_after)})
+
+@app.get("/metrics/admission")
+def admission_metrics():
+    """Current queue depth, in-flight count and rejection counters for each admission controller."""
+    return {controller.name: controller.metrics() for controller in (extraction_admission, verification_admission)}
+
 @app.post("/extract-from-text/", response_model=List[DrugInput])
+@trace_request("POST /extract-from-text/")
 def extract_from_text(text: str):
     """Extracts structured drug information from raw text."""
     if not text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty.")
     return extract_drug_info(text)
 
-@app.post("/verify-prescription/", response_model=VerificationResponse)
-def verify_prescription(request: VerificationRequest):
-    """Verifies a prescription for interactions, dosage, and suggests alternatives."""
-    drug_names = [drug.name for drug in request.drugs]
+def _drug_key(name: str) -> str:
+    return normalize_drug_name(name)
+
+def _request_key(request: VerificationRequest) -> tuple:
+    """
+    Cache key for a whole response: the drugs exactly as submitted, in order, the age and the
+    paging options. The response echoes the names, doses and age back in its text, so only an
+    identical request may replay it. Equivalent spellings still share the per-drug caches
+    (RxCUIs, LLM dosage analyses and alternatives).
+    """
+    drugs = tuple((drug.name, drug.dosage) for drug in request.drugs)
+    return (drugs, request.age, request.compact, request.limit, request.offset)
+
+def _etag_for(result: VerificationResponse) -> str:
+    return '"' + hashlib.sha256(result.model_dump_json().encode()).hexdigest()[:32] + '"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _is_cacheable(result: VerificationResponse) -> bool:
+    """Responses from a failed or partial check (LLM failure, RxNav failure, unresolved names) are not memoized."""
+    if not result.interaction_check_complete or result.unresolved_drugs:
+        return False
+    texts = result.dosage_warnings + result.alternative_suggestions
+    return not any(message in text for text in texts for message in LLM_FAILURE_MESSAGES)
 
-    # 1. Drug Interaction Detection
-    interaction_results = get_interactions(drug_names)
+def _new_state(age: int) -> dict:
+    return {"age": age, "drugs": {}, "rxcuis": {}, "interactions": [], "interaction_check_complete": True, "dosage_warnings": {}}
 
-    # 2. Age-Specific Dosage Recommendation (using LLM)
-    dosage_warnings = []
-    for drug in request.drugs:
-        if drug.dosage:
-            warning = analyze_dosage_with_llm(request.age, drug.name, drug.dosage)
-            dosage_warnings.append(f"Analysis for {drug.name} {drug.dosage}: {warning}")
+def _apply_changes(state: dict, age: int, added: List[DrugInput], removed: List[DrugInput]) -> dict:
+    """
+    Returns a new verification state with the given drugs added and removed. Only the
+    work the change invalidates is redone: RxCUIs for new (or still unresolved) drug names,
+    interaction pairs involving a new RxCUI (all pairs if the last check was incomplete),
+    and dosage analyses for new doses (or all doses if the age changed).
+    """
+    # Drugs are keyed by (name, dosage) so the same drug may appear at several doses.
+    drugs = dict(state["drugs"])
+    for drug in removed:
+        name_key = _drug_key(drug.name)
+        for key in [key for key in drugs if key[0] == name_key and drug.dosage in (None, key[1])]:
+            del drugs[key]
+    for drug in added:
+        drugs[(_drug_key(drug.name), drug.dosage)] = drug
 
-    # 3. Alternative Medication Suggestions (using LLM for interacting drugs)
+    # 1. Drug Interaction Detection: resolve names we have not seen (or could not resolve) before
+    present_names = {name_key for name_key, _ in drugs}
+    rxcuis = {name_key: rxcui for name_key, rxcui in state["rxcuis"].items() if name_key in present_names}
+    new_names = {}
+    for (name_key, _), drug in drugs.items():
+        if not rxcuis.get(name_key):
+            new_names.setdefault(name_key, drug.name)
+    if new_names:
+        print("\n--- Starting Drug Interaction Check ---")
+        resolved = resolve_rxcuis(list(new_names.values()))
+        rxcuis.update({name_key: resolved[name] for name_key, name in new_names.items()})
+
+    active_rxcuis = list(dict.fromkeys(rxcui for rxcui in rxcuis.values() if rxcui))
+    previous_rxcuis = {rxcui for rxcui in state["rxcuis"].values() if rxcui}
+    interactions = [item for item in state["interactions"] if set(item["rxcuis"]) <= set(active_rxcuis)]
+    added_rxcuis = set(active_rxcuis) - previous_rxcuis
+    interaction_check_complete = True
+    if not state["interaction_check_complete"]:
+        # The previous check may have missed any pair, so check the whole list again.
+        interactions, interaction_check_complete = get_interactions_for_rxcuis(active_rxcuis)
+    elif added_rxcuis:
+        fetched, interaction_check_complete = get_interactions_for_rxcuis(active_rxcuis, only_involving=added_rxcuis)
+        interactions += fetched
+
+    # 2. Age-Specific Dosage Recommendation (using LLM), reusing analyses for unchanged doses
+    previous_warnings = state["dosage_warnings"] if state["age"] == age else {}
+    dosage_warnings = {}
+    with span("verify.dosage_analysis", drug_count=len(drugs)):
+        for key, drug in drugs.items():
+            if drug.dosage:
+                warning = previous_warnings.get(key)
+                if warning is None:
+                    warning = analyze_dosage_with_llm(age, drug.name, drug.dosage)
+                dosage_warnings[key] = warning
+
+    return {
+        "age": age, "drugs": drugs, "rxcuis": rxcuis, "interactions": interactions,
+        "interaction_check_complete": interaction_check_complete, "dosage_warnings": dosage_warnings
+    }
+
+def _build_response(state: dict, options: ResultOptions) -> VerificationResponse:
+    """Stores the state under a fresh result token and renders it as a VerificationResponse."""
+    interaction_results = state["interactions"]
+
+    # 3. Alternative Medication Suggestions (using LLM for the top-K interacting pairs)
     alternatives = []
     if interaction_results:
-        problem_drug = interaction_results[0]['drugs_involved'][0]
-        interacting_drug = interaction_results[0]['drugs_involved'][1]
-        suggestion = suggest_alternatives_with_llm(problem_drug, interacting_drug)
-        alternatives.append(suggestion)
+        ranked_pairs, _ = compact_interactions(interaction_results, limit=MAX_ALTERNATIVE_PAIRS)
+        pairs = [tuple(result['drugs_involved'][:2]) for result in ranked_pairs]
+        with span("verify.alternatives", pair_count=len(pairs)):
+            suggestions = suggest_alternatives_for_pairs(pairs)
+        for problem_drug, interacting_drug, suggestion in suggestions:
+            alternatives.append(f"Alternative for {problem_drug} (interacts with {interacting_drug}): {suggestion}")
+
+    total_interactions = None
+    if options.compact:
+        interaction_results, total_interactions = compact_interactions(
+            interaction_results, limit=options.limit, offset=options.offset
+        )
+
+    dosage_warnings = [
+        f"Analysis for {state['drugs'][key].name} {state['drugs'][key].dosage}: {warning}"
+        for key, warning in state["dosage_warnings"].items()
+    ]
+
+    unresolved_drugs = sorted({drug.name for (name_key, _), drug in state["drugs"].items() if not state["rxcuis"].get(name_key)})
+
+    token = uuid.uuid4().hex
+    _verification_states.set(token, state)
 
     return VerificationResponse(
         interactions=interaction_results,
+        total_interactions=total_interactions,
         dosage_warnings=dosage_warnings,
-        alternative_suggestions=alternatives
-    )
\ No newline at end of file
+        alternative_suggestions=alternatives,
+        result_token=token,
+        interaction_check_complete=state["interaction_check_complete"],
+        unresolved_drugs=unresolved_drugs
+    )
+
+@app.post("/verify-prescription/", response_model=VerificationResponse)
+@trace_request("POST /verify-prescription/")
+def verify_prescription(request: VerificationRequest, response: Response, if_none_match: Optional[str] = Header(default=None)):
+    """
+    Verifies a prescription for interactions, dosage, and suggests alternatives.
+    Repeated prescriptions are served from cache, and a matching If-None-Match gets a 304.
+    """
+    key = _request_key(request)
+    cached = _response_cache.get(key)
+    set_attribute("cache_hit", cached is not None)
+    if cached is not None:
+        etag, result = cached
+        print("Serving verification from the response cache.")
+    else:
+        state = _apply_changes(_new_state(request.age), request.age, request.drugs, [])
+        result = _build_response(state, request)
+        etag = _etag_for(result)
+        if _is_cacheable(result):
+            _response_cache.set(key, (etag, result))
+
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return result
+
+@app.post("/verify-prescription/incremental/", response_model=VerificationResponse)
+@trace_request("POST /verify-prescription/incremental/")
+def verify_prescription_incremental(request: IncrementalVerificationRequest):
+    """Re-verifies a previously verified prescription after drugs were added or removed."""
+    if request.previous_token:
+        previous_state = _verification_states.get(request.previous_token)
+        if previous_state is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired result token. Verify the full prescription again.")
+    else:
+        previous_state = _new_state(request.age)
+
+    state = _apply_changes(previous_state, request.age, request.added, request.removed)
+    return _build_response(state, request)
\ No newline at end of file
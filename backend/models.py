@@ -1,15 +1,29 @@
 # models.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class DrugInput(BaseModel):
     name: str
     dosage: Optional[str] = None
 
-class VerificationRequest(BaseModel):
+class ResultOptions(BaseModel):
+    # Compact mode collapses duplicate/symmetric pairs, ranks them by severity and pages them.
+    compact: bool = False
+    limit: Optional[int] = Field(default=None, ge=1)
+    offset: int = Field(default=0, ge=0)
+
+class VerificationRequest(ResultOptions):
     age: int
     drugs: List[DrugInput]
 
+class IncrementalVerificationRequest(ResultOptions):
+    # Token from a previous response; omit it to start from an empty drug list.
+    previous_token: Optional[str] = None
+    age: int
+    added: List[DrugInput] = []
+    # A removed drug without a dosage removes every entry with that name.
+    removed: List[DrugInput] = []
+
 class InteractionResult(BaseModel):
     drugs_involved: List[str]
     severity: str
@@ -17,5 +31,13 @@ class InteractionResult(BaseModel):
 
 class VerificationResponse(BaseModel):
     interactions: List[InteractionResult]
+    # Number of distinct interacting pairs before paging; only set in compact mode.
+    total_interactions: Optional[int] = None
     dosage_warnings: List[str]
-    alternative_suggestions: List[str]
\ No newline at end of file
+    alternative_suggestions: List[str]
+    # Pass back as previous_token to re-verify incrementally after editing the drug list.
+    result_token: Optional[str] = None
+    # False when an RxNav request (or polypharmacy chunk) failed, so interactions may be missing.
+    interaction_check_complete: bool = True
+    # Drug names that could not be resolved to an RxCUI and were left out of the interaction check.
+    unresolved_drugs: List[str] = []
\ No newline at end of file
@@ -1,100 +1,129 @@
-import os
-import requests
 import json
-import re
-from dotenv import load_dotenv
+from pydantic import ValidationError
+from models import DrugInput
+from drug_normalizer import normalize_drug_name
+from llm_providers import provider_chain, EXTRACTION_PROVIDER_ORDER
+from tracing import span, traced
 
-load_dotenv()
+# How many times a provider is asked for the drugs missing from a truncated answer.
+MAX_CONTINUATION_QUERIES = 2
 
-# --- Load BOTH API Keys ---
-HF_API_TOKEN = os.getenv("HF_API_TOKEN")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-# --- Define BOTH Service Endpoints ---
-GRANITE_API_URL = "https://api-inference.huggingface.co/models/ibm-granite/granite-3.3-2b-instruct"
-HF_HEADERS = {"Authorization": f"Bearer {HF_API_TOKEN}"}
-
-GOOGLE_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GOOGLE_API_KEY}"
-GOOGLE_HEADERS = {"Content-Type": "application/json"}
-
-
-def _query_granite_for_extraction(text: str) -> list | None:
-    """Attempts to extract data using the IBM Granite model. Returns None on failure."""
-    if not HF_API_TOKEN:
-        print("Hugging Face token not found, cannot query Granite.")
-        return None
-
-    prompt = f"""
+# --- Extraction prompts. Providers without a dedicated template use the default one. ---
+GRANITE_EXTRACTION_PROMPT = """
 Instruction: You are a medical data extraction tool. Analyze the following prescription note and extract all drug names and their corresponding dosages.
 Your response MUST be a valid JSON list of objects, where each object has a "name" and a "dosage" key. If a dosage is not mentioned, set the value to null.
-
+{already_extracted}
 Prescription Note: "{text}"
 
 JSON Response:
 """
-    payload = {"inputs": prompt, "parameters": {"max_new_tokens": 256, "temperature": 0.1, "return_full_text": False}}
-
-    try:
-        response = requests.post(GRANITE_API_URL, headers=HF_HEADERS, json=payload, timeout=45)
-        if response.status_code == 200:
-            generated_text = response.json()[0]['generated_text'].strip()
-            # Search for the JSON block within the response
-            match = re.search(r'\[.*\]', generated_text, re.DOTALL)
-            if match:
-                json_string = match.group(0)
-                try:
-                    print("Successfully extracted data using IBM Granite.")
-                    return json.loads(json_string)
-                except json.JSONDecodeError:
-                    print(f"Granite returned a JSON-like string but it was invalid: {json_string}")
-                    return None
-        print(f"Granite API returned an error: {response.status_code} - {response.text}")
-        return None # Signal failure
-    except requests.exceptions.RequestException as e:
-        print(f"A network error occurred while contacting Granite: {e}")
-        return None # Signal failure
-
-def _query_google_for_extraction(text: str) -> list:
-    """Extracts data using the Google Gemini API as a reliable backup."""
-    if not GOOGLE_API_KEY:
-        print("Google API Key not found. Cannot fall back.")
-        return []
-
-    prompt = f"""
+
+DEFAULT_EXTRACTION_PROMPT = """
 You are a highly precise data extraction tool. Analyze the following medical note.
 Extract all drug names and their dosages into a valid JSON list of objects.
 Each object must have two keys: "name" and "dosage". If a dosage is not explicitly mentioned for a drug, set its value to null.
 Do not provide any explanation or introductory text. Your output must be only the JSON list.
-
+{already_extracted}
 Medical Note: "{text}"
 """
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-
-    try:
-        response = requests.post(GOOGLE_API_URL, headers=GOOGLE_HEADERS, json=payload, timeout=60)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Google's Gemini sometimes wraps the JSON in markdown backticks, so we clean it up
-        response_text = data['candidates'][0]['content']['parts'][0]['text'].strip()
-        cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
-        
-        print("Successfully extracted data using Google Gemini fallback.")
-        return json.loads(cleaned_text)
-    except Exception as e:
-        print(f"An error occurred while falling back to Google Gemini: {e}")
-        return []
 
+ALREADY_EXTRACTED_NOTE = "These drugs were already extracted, so do not repeat them and list only the remaining ones (an empty list if there are none): {names}\n"
+
+EXTRACTION_PROMPTS = {"granite": GRANITE_EXTRACTION_PROMPT}
+
+
+_decoder = json.JSONDecoder()
+
+def _salvage_drug_objects(generated_text: str) -> tuple[list | None, bool]:
+    """
+    Recovers every complete {name, dosage} object from a possibly truncated or messy
+    model response, validating each against DrugInput.
+    Returns (drugs, complete): drugs is None when the response holds no JSON at all, and
+    complete is False when the list was cut off, so some drugs may be missing.
+    """
+    # Models sometimes wrap the JSON in markdown backticks, so we clean it up
+    cleaned_text = generated_text.replace("```json", "").replace("```", "")
+    list_start = cleaned_text.find("[")
+    position = list_start + 1 if list_start != -1 else 0
+
+    drugs = []
+    found_json = list_start != -1
+    complete = True
+    last_object_end = position
+    while (position := cleaned_text.find("{", position)) != -1:
+        try:
+            item, end = _decoder.raw_decode(cleaned_text, position)
+        except json.JSONDecodeError:
+            # An object that does not parse is almost always the one the token limit cut off.
+            complete = False
+            position += 1
+            continue
+        found_json = True
+        position = last_object_end = end
+        if not isinstance(item, dict):
+            continue
+        if item.get("dosage") is not None and not isinstance(item["dosage"], str):
+            item["dosage"] = str(item["dosage"])
+        try:
+            drugs.append(DrugInput(**item))
+        except (ValidationError, TypeError):
+            print(f"Skipping extracted item that is not a valid drug entry: {item}")
+
+    if not found_json:
+        return None, False
+    if "]" not in cleaned_text[last_object_end:]:
+        complete = False
+    return drugs, complete
+
+def _merge_drugs(drugs: list, new_drugs: list) -> list:
+    """Appends drugs not already present, matching on canonical name and dosage."""
+    seen = {(normalize_drug_name(drug.name), drug.dosage) for drug in drugs}
+    merged = list(drugs)
+    for drug in new_drugs:
+        key = (normalize_drug_name(drug.name), drug.dosage)
+        if key not in seen:
+            seen.add(key)
+            merged.append(drug)
+    return merged
+
+def _build_extraction_prompt(provider_name: str, text: str, drugs: list) -> str:
+    already_extracted = ""
+    if drugs:
+        already_extracted = ALREADY_EXTRACTED_NOTE.format(names=json.dumps([drug.name for drug in drugs]))
+    template = EXTRACTION_PROMPTS.get(provider_name, DEFAULT_EXTRACTION_PROMPT)
+    return template.format(text=text, already_extracted=already_extracted)
+
+@traced("nlp_processor.extract_drug_info")
 def extract_drug_info(text: str) -> list:
     """
-    Main function for extraction. First tries IBM Granite, falls back to Google Gemini on failure.
+    Main function for extraction. Tries each provider in EXTRACTION_PROVIDER_ORDER
+    (local model, IBM Granite, Google Gemini by default). Complete objects are salvaged
+    from truncated answers, and only the drugs still missing are asked for again.
     """
-    print("Attempting to extract data using IBM Granite...")
-    granite_response = _query_granite_for_extraction(text)
-    
-    if granite_response is not None:
-        return granite_response
-    
-    print("IBM Granite failed or is unavailable. Falling back to Google Gemini for extraction.")
-    return _query_google_for_extraction(text)
-
+    drugs = []
+    for provider in provider_chain(EXTRACTION_PROVIDER_ORDER):
+        for _ in range(1 + MAX_CONTINUATION_QUERIES):
+            prompt = _build_extraction_prompt(provider.name, text, drugs)
+            print(f"Attempting to extract data using '{provider.name}'...")
+            with span("llm.generate", provider=provider.name, continuation=bool(drugs)):
+                generated_text = provider.generate(prompt, max_new_tokens=256, temperature=0.1)
+            if not generated_text:
+                break
+
+            salvaged, complete = _salvage_drug_objects(generated_text)
+            if salvaged is None:
+                print(f"'{provider.name}' did not return any JSON: {generated_text}")
+                break
+
+            drugs = _merge_drugs(drugs, salvaged)
+            if complete:
+                print(f"Successfully extracted data using '{provider.name}'.")
+                return drugs
+            print(f"'{provider.name}' returned a truncated list; recovered {len(drugs)} drug(s), asking for the rest...")
+        print(f"'{provider.name}' failed or is unavailable. Falling back to the next provider for extraction.")
+
+    if drugs:
+        print(f"Returning {len(drugs)} drug(s) recovered from partial responses.")
+    else:
+        print("No provider could extract drug information.")
+    return drugs
\ No newline at end of file
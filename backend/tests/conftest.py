@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os
+import sys
+
+# The backend modules import each other as top-level modules (e.g. "from models import ..."),
+# so the backend directory itself has to be importable.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,70 @@
+# tests/test_dosage_reference.py
+import pytest
+from dosage_reference import parse_dose, check_dosage_locally
+
+
+@pytest.mark.parametrize("dosage, expected", [
+    ("500mg", (500.0, "mg", None)),
+    ("500 mg twice daily", (500.0, "mg", 2.0)),
+    ("2 x 500 mg twice daily", (1000.0, "mg", 2.0)),
+    ("10 mg q8h", (10.0, "mg", 3.0)),
+    ("1 g every 6 hours", (1.0, "g", 4.0)),
+    ("take 500 mg by mouth once a day", (500.0, "mg", 1.0)),
+    ("500mg 4 times a day", (500.0, "mg", 4.0)),
+    (".5 mg once daily", (0.5, "mg", 1.0)),
+    ("0.5 mg once daily.", (0.5, "mg", 1.0)),
+])
+def test_parse_dose_complete(dosage, expected):
+    parsed = parse_dose(dosage)
+    assert (parsed.amount, parsed.unit, parsed.frequency_per_day) == expected
+    assert parsed.complete
+
+@pytest.mark.parametrize("dosage", [
+    "500 mg, 2 tablets four times a day",
+    "1000 mg every 4-6 hours",
+    "10 mg weekly",
+    "500mg prn",
+    "250mg/5ml three times a day",
+    "1,000 mg once daily",
+])
+def test_parse_dose_marks_leftovers_incomplete(dosage):
+    assert not parse_dose(dosage).complete
+
+def test_parse_dose_without_amount():
+    assert parse_dose("two tablets") is None
+
+def test_local_answer_for_single_dose_states_daily_maximum():
+    answer = check_dosage_locally(40, "paracetamol", "500mg")
+    assert answer is not None
+    assert "4000 mg in total per day" in answer
+    assert check_dosage_locally(40, "paracetamol", "1500mg") is None
+
+def test_local_answer_for_routine_dose():
+    answer = check_dosage_locally(40, "paracetamol", "500 mg twice daily")
+    assert answer is not None
+    assert "1000 mg per day" in answer
+
+@pytest.mark.parametrize("dosage", [
+    "500 mg, 2 tablets four times a day",  # real total 4000 mg, at the maximum
+    "1000 mg every 4-6 hours",  # range schedule
+    "10 mg weekly",  # weekly schedule
+    "1000mg 4 times a day",  # borderline daily total
+    "1500mg once daily",  # above the single-dose maximum
+])
+def test_partial_or_borderline_doses_go_to_llm(dosage):
+    assert check_dosage_locally(40, "paracetamol", dosage) is None
+
+def test_leading_decimal_point_is_not_dropped():
+    # ".5 mg" used to parse as 5 mg and pass as a routine amlodipine dose.
+    assert check_dosage_locally(40, "amlodipine", ".5 mg once daily") is None
+    assert check_dosage_locally(40, "amlodipine", "5 mg once daily") is not None
+
+@pytest.mark.parametrize("drug", ["Metformin ER", "metformin XR", "Glucophage XR", "Metformin extended-release"])
+def test_modified_release_products_go_to_llm(drug):
+    # 2000 mg/day is within the immediate-release limit but is the extended-release maximum.
+    assert check_dosage_locally(40, "Metformin", "1000 mg twice daily") is not None
+    assert check_dosage_locally(40, drug, "1000 mg twice daily") is None
+
+def test_unknown_drug_and_paediatric_age_go_to_llm():
+    assert check_dosage_locally(40, "warfarin", "5 mg once daily") is None
+    assert check_dosage_locally(8, "ibuprofen", "200 mg twice daily") is None
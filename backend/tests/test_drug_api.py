@@ -0,0 +1,78 @@
+# tests/test_drug_api.py
+import itertools
+import pytest
+import drug_api
+from drug_api import _overlapping_chunks, get_interactions_for_rxcuis, lookup_rxcui
+
+
+def _ids(count):
+    return [str(index) for index in range(1, count + 1)]
+
+@pytest.mark.parametrize("count", [11, 12, 25, 50, 100])
+@pytest.mark.parametrize("max_chunks", [1, 3, 6, 15])
+def test_every_pair_shares_a_chunk_when_blocks_are_enlarged(count, max_chunks):
+    rxcuis = _ids(count)
+    chunks = _overlapping_chunks(rxcuis, block_size=5, max_chunks=max_chunks)
+    assert len(chunks) <= max_chunks
+    for first, second in itertools.combinations(rxcuis, 2):
+        assert any(first in chunk and second in chunk for chunk in chunks), (first, second)
+
+def test_chunk_count_is_bounded_by_default():
+    assert len(_overlapping_chunks(_ids(50), block_size=5)) <= drug_api.POLYPHARMACY_MAX_CHUNKS
+
+
+def _fake_fetch(failing=()):
+    calls = []
+    def fetch(chunk):
+        calls.append(list(chunk))
+        if any(rxcui in failing for rxcui in chunk):
+            raise ValueError("truncated payload")
+        return [
+            {"drugs_involved": [a, b], "rxcuis": [a, b], "severity": "high", "description": f"{a}-{b}"}
+            for a, b in itertools.combinations(chunk, 2)
+        ]
+    return fetch, calls
+
+def test_chunked_check_merges_chunks_without_duplicates(monkeypatch):
+    fetch, calls = _fake_fetch()
+    monkeypatch.setattr(drug_api, "_fetch_interaction_list", fetch)
+    results, complete = get_interactions_for_rxcuis(_ids(12))
+    assert complete and len(calls) > 1
+    pairs = [frozenset(item["rxcuis"]) for item in results]
+    assert len(pairs) == len(set(pairs))
+    assert set(pairs) == {frozenset(pair) for pair in itertools.combinations(_ids(12), 2)}
+
+def test_failed_chunk_marks_check_incomplete_but_keeps_the_rest(monkeypatch):
+    fetch, _ = _fake_fetch(failing={"1"})
+    monkeypatch.setattr(drug_api, "_fetch_interaction_list", fetch)
+    results, complete = get_interactions_for_rxcuis(_ids(12))
+    assert not complete
+    assert results and all("1" not in item["rxcuis"] for item in results)
+
+def test_failed_single_request_returns_incomplete(monkeypatch):
+    fetch, _ = _fake_fetch(failing={"1"})
+    monkeypatch.setattr(drug_api, "_fetch_interaction_list", fetch)
+    assert get_interactions_for_rxcuis(_ids(3)) == ([], False)
+
+@pytest.fixture
+def rxnav_names(monkeypatch):
+    queries = []
+    known = {"novolin 70/30": "106892", "metformin": "6809"}
+    def get_rxcui(name, depth=0):
+        queries.append(name)
+        return known.get(name.lower())
+    monkeypatch.setattr(drug_api, "get_rxcui", get_rxcui)
+    drug_api._rxcui_cache.clear()
+    yield queries
+    drug_api._rxcui_cache.clear()
+
+def test_lookup_falls_back_to_the_name_as_typed(rxnav_names):
+    assert lookup_rxcui("Novolin  70/30") == "106892"
+    assert rxnav_names == ["novolin", "Novolin 70/30"]
+    # The fallback result is cached under the typed name, not the lossy canonical one.
+    assert lookup_rxcui("novolin 70/30") == "106892"
+    assert lookup_rxcui("Novolin") is None
+
+def test_lookup_uses_canonical_name_when_it_resolves(rxnav_names):
+    assert lookup_rxcui("Metformin HCl 500 mg tab") == "6809"
+    assert rxnav_names == ["metformin"]
\ No newline at end of file
@@ -0,0 +1,43 @@
+# tests/test_drug_normalizer.py
+import pytest
+from drug_normalizer import normalize_drug_name, is_modified_release
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Metformin HCl 500 mg tab", "metformin"),
+    ("  METFORMIN ER", "metformin"),
+    ("Metformin 500", "metformin"),
+    ("Amoxicillin 250mg/5ml susp", "amoxicillin"),
+    ("Ferrous Sulfate 325mg", "ferrous sulfate"),
+    ("ferrous sulphate", "ferrous sulfate"),
+    ("Paracetamol", "acetaminophen"),
+    ("", ""),
+])
+def test_normalize_single_ingredient(name, expected):
+    assert normalize_drug_name(name) == expected
+
+@pytest.mark.parametrize("name", ["Tylenol #3", "Tylenol 3", "tylenol # 3 300mg/30mg tab", "Tylenol with Codeine #3"])
+def test_numbered_brands_keep_their_number(name):
+    assert normalize_drug_name(name) == "acetaminophen / codeine"
+
+def test_unknown_numbered_name_is_not_collapsed():
+    assert normalize_drug_name("Tylenol #3") != normalize_drug_name("Tylenol")
+    assert normalize_drug_name("Foo #3") == "foo #3"
+
+@pytest.mark.parametrize("name", [
+    "Amlodipine besylate/Benazepril HCl",
+    "Amlodipine Besylate / Benazepril HCl 5/10 mg cap",
+    "Lotrel",
+])
+def test_combination_salts_are_stripped_per_ingredient(name):
+    assert normalize_drug_name(name) == "amlodipine / benazepril"
+
+def test_combination_matches_brand_synonym():
+    assert normalize_drug_name("Sulfamethoxazole/Trimethoprim") == normalize_drug_name("Bactrim")
+
+def test_modified_release_marker_is_detected_though_normalized_away():
+    assert normalize_drug_name("Metformin ER") == normalize_drug_name("Metformin")
+    assert is_modified_release("Metformin ER 500 mg tab")
+    assert is_modified_release("nifedipine extended-release")
+    assert not is_modified_release("Metformin HCl 500 mg tab")
+    assert not is_modified_release("Lasix")
\ No newline at end of file
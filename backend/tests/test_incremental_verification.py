@@ -0,0 +1,125 @@
+# tests/test_incremental_verification.py
+import itertools
+import pytest
+from fastapi.testclient import TestClient
+import main
+import drug_api
+
+RXCUIS = {"aspirin": "1", "warfarin": "2", "ibuprofen": "3"}
+
+
+class FakeUpstream:
+    """Stands in for RxNav and the LLMs, recording every call."""
+
+    def __init__(self):
+        self.rxcuis = dict(RXCUIS)
+        self.complete = True
+        self.resolved = []
+        self.fetches = []
+        self.dosage_checks = []
+
+    def get_rxcui(self, name, depth=0):
+        self.resolved.append(name)
+        return self.rxcuis.get(name.lower())
+
+    def get_interactions_for_rxcuis(self, rxcuis, only_involving=None):
+        self.fetches.append((sorted(rxcuis), only_involving))
+        results = [
+            {"drugs_involved": [a, b], "rxcuis": [a, b], "severity": "high", "description": f"{a}-{b}"}
+            for a, b in itertools.combinations(rxcuis, 2)
+            if not only_involving or only_involving & {a, b}
+        ]
+        return results, self.complete
+
+    def analyze_dosage(self, age, drug, dosage):
+        self.dosage_checks.append((age, drug))
+        return f"ok for {age}"
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = FakeUpstream()
+    monkeypatch.setattr(drug_api, "get_rxcui", fake.get_rxcui)
+    monkeypatch.setattr(main, "get_interactions_for_rxcuis", fake.get_interactions_for_rxcuis)
+    monkeypatch.setattr(main, "analyze_dosage_with_llm", fake.analyze_dosage)
+    monkeypatch.setattr(main, "suggest_alternatives_for_pairs", lambda pairs: [])
+    for cache in (drug_api._rxcui_cache, main._response_cache, main._verification_states):
+        cache.clear()
+    return fake
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+def _verify(client, drugs, age=40):
+    response = client.post("/verify-prescription/", json={"age": age, "drugs": drugs})
+    assert response.status_code == 200
+    return response.json()
+
+def _update(client, token, age=40, added=(), removed=()):
+    response = client.post("/verify-prescription/incremental/", json={
+        "previous_token": token, "age": age, "added": list(added), "removed": list(removed)
+    })
+    assert response.status_code == 200
+    return response.json()
+
+def _pairs(result):
+    return {item["description"] for item in result["interactions"]}
+
+ASPIRIN = {"name": "Aspirin", "dosage": "81mg"}
+WARFARIN = {"name": "Warfarin", "dosage": "5mg"}
+IBUPROFEN = {"name": "Ibuprofen", "dosage": "200mg"}
+
+def test_adding_a_drug_fetches_only_its_pairs_and_analyzes_only_its_dose(client, upstream):
+    first = _verify(client, [ASPIRIN, WARFARIN])
+    upstream.resolved.clear(), upstream.fetches.clear(), upstream.dosage_checks.clear()
+
+    result = _update(client, first["result_token"], added=[IBUPROFEN])
+    assert _pairs(result) == {"1-2", "1-3", "2-3"}
+    assert upstream.resolved == ["ibuprofen"]
+    assert upstream.fetches == [(["1", "2", "3"], {"3"})]
+    assert upstream.dosage_checks == [(40, "Ibuprofen")]
+
+def test_removing_a_drug_needs_no_upstream_calls(client, upstream):
+    first = _verify(client, [ASPIRIN, WARFARIN, IBUPROFEN])
+    upstream.fetches.clear(), upstream.dosage_checks.clear()
+
+    result = _update(client, first["result_token"], removed=[{"name": "warfarin"}])
+    assert _pairs(result) == {"1-3"}
+    assert [warning.split(":")[0] for warning in result["dosage_warnings"]] == ["Analysis for Aspirin 81mg", "Analysis for Ibuprofen 200mg"]
+    assert upstream.fetches == [] and upstream.dosage_checks == []
+
+def test_age_change_reanalyzes_every_dose_but_not_interactions(client, upstream):
+    first = _verify(client, [ASPIRIN, WARFARIN])
+    upstream.fetches.clear(), upstream.dosage_checks.clear()
+
+    result = _update(client, first["result_token"], age=70)
+    assert sorted(upstream.dosage_checks) == [(70, "Aspirin"), (70, "Warfarin")]
+    assert upstream.fetches == []
+    assert _pairs(result) == {"1-2"}
+
+def test_previously_unresolved_name_is_retried(client, upstream):
+    del upstream.rxcuis["ibuprofen"]
+    first = _verify(client, [ASPIRIN, WARFARIN, IBUPROFEN])
+    assert first["unresolved_drugs"] == ["Ibuprofen"]
+
+    upstream.rxcuis["ibuprofen"] = "3"
+    upstream.fetches.clear()
+    result = _update(client, first["result_token"])
+    assert result["unresolved_drugs"] == []
+    assert upstream.fetches == [(["1", "2", "3"], {"3"})]
+    assert _pairs(result) == {"1-2", "1-3", "2-3"}
+
+def test_incomplete_check_is_redone_in_full(client, upstream):
+    upstream.complete = False
+    first = _verify(client, [ASPIRIN, WARFARIN])
+    assert not first["interaction_check_complete"]
+
+    upstream.complete = True
+    upstream.fetches.clear()
+    result = _update(client, first["result_token"], removed=[{"name": "Aspirin"}], added=[IBUPROFEN])
+    assert result["interaction_check_complete"]
+    assert upstream.fetches == [(["2", "3"], None)]
+
+def test_unknown_token_is_rejected(client, upstream):
+    response = client.post("/verify-prescription/incremental/", json={"previous_token": "expired", "age": 40})
+    assert response.status_code == 404
\ No newline at end of file
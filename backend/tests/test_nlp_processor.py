@@ -0,0 +1,71 @@
+# tests/test_nlp_processor.py
+import pytest
+import llm_providers
+import nlp_processor
+from nlp_processor import _salvage_drug_objects, extract_drug_info
+
+
+def _pairs(drugs):
+    return [(drug.name, drug.dosage) for drug in drugs]
+
+def test_salvages_complete_objects_from_truncated_tail():
+    drugs, complete = _salvage_drug_objects('[{"name": "Aspirin", "dosage": "81mg"}, {"name": "Warfarin", "dos')
+    assert _pairs(drugs) == [("Aspirin", "81mg")]
+    assert not complete
+
+def test_skips_malformed_middle_object():
+    text = '[{"name": "Aspirin", "dosage": null}, {"name": Warfarin}, {"name": "Metformin", "dosage": 500}]'
+    drugs, complete = _salvage_drug_objects(text)
+    assert _pairs(drugs) == [("Aspirin", None), ("Metformin", "500")]
+    # A broken object is treated like a cut-off one, so the provider is asked for the rest.
+    assert not complete
+
+@pytest.mark.parametrize("text", [
+    '```json\n[{"name": "Aspirin", "dosage": "81mg"}]\n```',
+    'Here is the list:\n```\n[{"name": "Aspirin", "dosage": "81mg"}]\n```',
+    '{"medications": [{"name": "Aspirin", "dosage": "81mg"}]}',
+])
+def test_unwraps_fenced_and_wrapped_lists(text):
+    drugs, complete = _salvage_drug_objects(text)
+    assert _pairs(drugs) == [("Aspirin", "81mg")]
+    assert complete
+
+def test_empty_list_and_no_json():
+    assert _salvage_drug_objects("[]") == ([], True)
+    assert _salvage_drug_objects("No medications were mentioned.") == (None, False)
+
+
+class _ScriptedProvider(llm_providers.LLMProvider):
+    name = "scripted"
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def generate(self, prompt, max_new_tokens=None, temperature=None):
+        self.prompts.append(prompt)
+        return self.responses.pop(0) if self.responses else None
+
+@pytest.fixture
+def scripted_provider(monkeypatch):
+    def install(*responses):
+        provider = _ScriptedProvider(responses)
+        monkeypatch.setitem(llm_providers._providers, provider.name, provider)
+        monkeypatch.setattr(nlp_processor, "EXTRACTION_PROVIDER_ORDER", provider.name)
+        return provider
+    return install
+
+def test_continuation_merges_new_drugs_without_duplicates(scripted_provider):
+    provider = scripted_provider(
+        '[{"name": "Aspirin", "dosage": "81mg"}, {"name": "Warfarin", "dosage": "5mg"}, {"name": "Metf',
+        # The model repeats drugs it was told about, with different capitalization.
+        '[{"name": "aspirin", "dosage": "81mg"}, {"name": "Metformin", "dosage": "500mg"}]'
+    )
+    drugs = extract_drug_info("Aspirin 81mg, warfarin 5mg and metformin 500mg.")
+    assert _pairs(drugs) == [("Aspirin", "81mg"), ("Warfarin", "5mg"), ("Metformin", "500mg")]
+    assert len(provider.prompts) == 2
+    assert '["Aspirin", "Warfarin"]' in provider.prompts[1]
+
+def test_partial_result_is_returned_when_provider_gives_up(scripted_provider):
+    scripted_provider('[{"name": "Aspirin", "dosage": "81mg"}, {"na')
+    assert _pairs(extract_drug_info("Aspirin 81mg and more.")) == [("Aspirin", "81mg")]
\ No newline at end of file
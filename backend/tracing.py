@@ -0,0 +1,189 @@
+# tracing.py
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import threading
+import functools
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+# --- Span export: one OTLP-style JSON object per line. Export is off when the path is unset. ---
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+
+# --- Opt-in sampling profiler for slow requests. A threshold of 0 disables it. ---
+SLOW_REQUEST_PROFILE_MS = float(os.getenv("SLOW_REQUEST_PROFILE_MS", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10"))
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "profiles")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+# The profiler of the request being handled, so worker threads it starts can be sampled too.
+_active_sampler = contextvars.ContextVar("active_sampler", default=None)
+_export_lock = threading.Lock()
+
+
+def _export(record: dict) -> None:
+    if not TRACE_EXPORT_PATH:
+        return
+    line = json.dumps(record, default=str)
+    with _export_lock:
+        with open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as trace_file:
+            trace_file.write(line + "\n")
+
+@contextmanager
+def span(name: str, **attributes):
+    """Records a span around the enclosed block, nested under the current span if there is one."""
+    parent = _current_span.get()
+    record = {
+        "traceId": parent["traceId"] if parent else uuid.uuid4().hex,
+        "spanId": uuid.uuid4().hex[:16],
+        "parentSpanId": parent["spanId"] if parent else None,
+        "name": name,
+        "startTimeUnixNano": time.time_ns(),
+        "attributes": attributes,
+        "status": "OK"
+    }
+    token = _current_span.set(record)
+    try:
+        yield record
+    except Exception as e:
+        record["status"] = "ERROR"
+        record["attributes"]["error"] = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        record["endTimeUnixNano"] = time.time_ns()
+        _export(record)
+
+def set_attribute(key: str, value) -> None:
+    """Adds an attribute to the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current["attributes"][key] = value
+
+def traced(name: str):
+    """Decorator that wraps every call of the function in a span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def in_current_context(func):
+    """
+    Binds func to a copy of the caller's context so spans opened in a worker thread
+    nest under the span that submitted the work, and the thread is sampled while the
+    submitting request is being profiled. Call once per submitted task.
+    """
+    context = contextvars.copy_context()
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        sampler = context.get(_active_sampler)
+        if sampler is None:
+            return context.run(func, *args, **kwargs)
+        thread = threading.current_thread()
+        sampler.add_thread(thread.ident, thread.name)
+        try:
+            return context.run(func, *args, **kwargs)
+        finally:
+            sampler.remove_thread(thread.ident)
+    return wrapper
+
+
+class _StackSampler:
+    """
+    Samples the call stacks of a set of threads at a fixed interval from a background thread.
+    Each stack is prefixed with its thread's name, so worker threads show up as their own roots.
+    """
+
+    def __init__(self, thread_id: int, thread_name: str, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self.samples = Counter()
+        # ident -> [name, registrations]; a worker may be registered again by a nested task.
+        self._threads = {thread_id: [thread_name, 1]}
+        self._threads_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="slow-request-sampler", daemon=True)
+
+    def add_thread(self, thread_id: int, thread_name: str):
+        with self._threads_lock:
+            self._threads.setdefault(thread_id, [thread_name, 0])[1] += 1
+
+    def remove_thread(self, thread_id: int):
+        with self._threads_lock:
+            entry = self._threads.get(thread_id)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._threads[thread_id]
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            with self._threads_lock:
+                threads = {thread_id: entry[0] for thread_id, entry in self._threads.items()}
+            frames = sys._current_frames()
+            for thread_id, thread_name in threads.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(thread_name)
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self._thread.join()
+        return self.samples
+
+@contextmanager
+def profile_if_slow(name: str):
+    """
+    Samples the current thread, and any worker threads running tasks it submitted through
+    in_current_context, while the block runs and, if it took longer than
+    SLOW_REQUEST_PROFILE_MS, writes the samples in collapsed-stack format (readable by
+    flamegraph.pl and speedscope) to PROFILE_OUTPUT_DIR.
+    """
+    if SLOW_REQUEST_PROFILE_MS <= 0:
+        yield
+        return
+
+    sampler = _StackSampler(threading.get_ident(), threading.current_thread().name, PROFILE_SAMPLE_INTERVAL_MS)
+    sampler.start()
+    token = _active_sampler.set(sampler)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _active_sampler.reset(token)
+        samples = sampler.stop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= SLOW_REQUEST_PROFILE_MS and samples:
+            current = _current_span.get()
+            trace_id = current["traceId"] if current else uuid.uuid4().hex
+            os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_OUTPUT_DIR, f"{name}-{int(time.time())}-{trace_id}.folded")
+            with open(path, "w", encoding="utf-8") as profile_file:
+                for stack, count in samples.most_common():
+                    profile_file.write(f"{stack} {count}\n")
+            set_attribute("profile", path)
+            print(f"Slow request '{name}' took {elapsed_ms:.0f} ms; profile written to {path}")
+
+def trace_request(name: str):
+    """Decorator for endpoint handlers: opens the root span and profiles the call if it is slow."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name), profile_if_slow(re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-")):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
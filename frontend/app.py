@@ -1,15 +1,16 @@
 # frontend/app.py
 import streamlit as st
 import requests
-import time
 import json
+from backend_client import BackendError, extract_drugs, verify_prescription
 
 # --- Configuration ---
-BACKEND_URL = "http://127.0.0.1:8000"
+# Upper bound on interaction cards rendered per check; the backend pages the rest.
+MAX_RENDERED_INTERACTIONS = 20
 
 # --- Custom CSS for Modern Design ---
-def load_custom_css():
-    st.markdown("""
+# Built once at import; Streamlit needs it re-emitted on every rerun, which is just a string write.
+CUSTOM_CSS = """
     <style>
     /* Import Google Fonts */
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
@@ -186,61 +187,56 @@ def load_custom_css():
         background: #f0f9f4;
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+def load_custom_css():
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # --- Enhanced Helper Functions ---
-def verify_prescription_data(age, drugs):
+def verify_prescription_data(age, drugs, compact=False, limit=None, incremental_key=None):
     if not drugs:
         st.error("⚠️ Please enter at least one drug name.")
         return None
     
-    request_data = {"age": age, "drugs": drugs}
+    options = {"compact": True, "limit": limit} if compact else {}
     
     # Create progress bar
     progress_bar = st.progress(0)
     status_text = st.empty()
     
     try:
-        status_text.text("🔍 Connecting to AI backend...")
-        progress_bar.progress(25)
-        time.sleep(0.5)
-        
-        status_text.text("🧠 AI analyzing drug interactions...")
-        progress_bar.progress(50)
-        
-        response = requests.post(f"{BACKEND_URL}/verify-prescription/", json=request_data)
-        progress_bar.progress(75)
-        
-        status_text.text("📊 Processing results...")
-        time.sleep(0.5)
-        progress_bar.progress(100)
-        
-        status_text.text("✅ Analysis complete!")
-        time.sleep(0.5)
+        results = verify_prescription(age, drugs, options, progress_bar, status_text, incremental_key=incremental_key)
         
         # Clear progress indicators
         progress_bar.empty()
         status_text.empty()
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"❌ Backend Error: {response.json().get('detail', response.text)}")
-            return None
+        return results
+    except BackendError as e:
+        progress_bar.empty()
+        status_text.empty()
+        st.error(f"❌ Backend Error: {e}")
+        return None
     except requests.exceptions.RequestException as e:
         progress_bar.empty()
         status_text.empty()
         st.error(f"🔌 Connection Error: Could not connect to the backend. Please ensure it is running.\n\nError: {e}")
         return None
 
-def display_interaction_results(interactions):
+def display_interaction_results(interactions, total=None, complete=True, unresolved=None):
+    if unresolved:
+        st.warning(f"⚠️ **Not checked for interactions** (name not recognized): {', '.join(unresolved)}")
+    if not complete:
+        st.error("⚠️ **The interaction check did not complete.** Some interactions may be missing; please try again.")
     if not interactions:
+        if not complete:
+            return
         st.success("✅ **No harmful drug interactions detected!** Your medications appear to be safe to take together.")
         return
     
-    st.warning(f"⚠️ **{len(interactions)} potential interaction(s) found:**")
+    total = total or len(interactions)
+    st.warning(f"⚠️ **{total} potential interaction(s) found:**")
     
-    for i, interaction in enumerate(interactions, 1):
+    for i, interaction in enumerate(interactions[:MAX_RENDERED_INTERACTIONS], 1):
         severity = interaction.get('severity', 'Unknown').lower()
         severity_class = f"severity-{severity}" if severity in ['high', 'medium', 'low'] else ""
         
@@ -258,6 +254,10 @@ def display_interaction_results(interactions):
         </div>
         """, unsafe_allow_html=True)
 
+    hidden = total - min(len(interactions), MAX_RENDERED_INTERACTIONS)
+    if hidden > 0:
+        st.caption(f"Showing the {total - hidden} most severe interactions; {hidden} lower-ranked interaction(s) not shown.")
+
 def display_dosage_warnings(warnings):
     if not warnings:
         st.info("ℹ️ No specific dosage concerns identified.")
@@ -348,7 +348,7 @@ with tab1:
             
             cols = st.columns([4, 2, 1])
             drug['name'] = cols[0].text_input(f"Drug Name", value=drug['name'], key=f"int_name_{i}", placeholder="e.g., Aspirin")
-            drug['dosage'] = cols[1].text_input(f"Dosage", value=drug['dosage'], key=f"int_dosage_{i}", placeholder="e.g., 100mg")
+            drug['dosage'] = cols[1].text_input(f"Dosage", value=drug['dosage'], key=f"int_dosage_{i}", placeholder="e.g., 100mg once daily")
             
             if len(st.session_state.interaction_drugs) > 2:
                 if cols[2].button("🗑️", key=f"remove_{i}", help="Remove this drug"):
@@ -365,11 +365,17 @@ with tab1:
         with col_analyze:
             if st.button("🔍 Analyze Interactions", type="primary", key="analyze_interactions", use_container_width=True):
                 valid_drugs = [d for d in st.session_state.interaction_drugs if d['name'].strip()]
-                results = verify_prescription_data(age_interaction, valid_drugs)
+                results = verify_prescription_data(
+                    age_interaction, valid_drugs, compact=True, limit=MAX_RENDERED_INTERACTIONS,
+                    incremental_key="interaction_verification"
+                )
                 
                 if results:
                     st.markdown("---")
-                    display_interaction_results(results['interactions'])
+                    display_interaction_results(
+                        results['interactions'], results.get('total_interactions'),
+                        results.get('interaction_check_complete', True), results.get('unresolved_drugs')
+                    )
                     display_dosage_warnings(results['dosage_warnings'])
                     display_alternatives(results['alternative_suggestions'])
 
@@ -414,7 +420,7 @@ with tab2:
         
         cols = st.columns([3, 2])
         dosage_drug_name = cols[0].text_input("Drug Name", key="dosage_drug_name", placeholder="e.g., Ibuprofen")
-        dosage_drug_amount = cols[1].text_input("Dosage", placeholder="e.g., 400mg", key="dosage_drug_amount")
+        dosage_drug_amount = cols[1].text_input("Dosage", placeholder="e.g., 400mg three times daily", key="dosage_drug_amount")
 
         if st.button("🔍 Analyze Dosage Safety", type="primary", use_container_width=True):
             if dosage_drug_name and dosage_drug_amount:
@@ -488,53 +494,42 @@ Instructions: Take all medications as prescribed. Follow up in 3 months."""
             status_text = st.empty()
             
             try:
-                status_text.text("🔍 Analyzing prescription text...")
-                progress_bar.progress(33)
-                time.sleep(0.5)
-                
-                status_text.text("🧠 AI extracting medication data...")
-                progress_bar.progress(66)
-                
-                response = requests.post(f"{BACKEND_URL}/extract-from-text/", params={"text": unstructured_text})
-                progress_bar.progress(100)
-                
-                status_text.text("✅ Extraction complete!")
-                time.sleep(0.5)
+                extracted_drugs = extract_drugs(unstructured_text, progress_bar, status_text)
                 
                 # Clear progress indicators
                 progress_bar.empty()
                 status_text.empty()
                 
-                if response.status_code == 200:
-                    extracted_drugs = response.json()
-                    if extracted_drugs:
-                        st.markdown("---")
-                        st.subheader("✅ Extracted Medications")
-                        
-                        for i, drug in enumerate(extracted_drugs, 1):
-                            drug_name = drug.get('name', 'N/A')
-                            drug_dosage = drug.get('dosage', 'Not specified')
-                            
-                            st.markdown(f"""
-                            <div class="result-card">
-                                <h4>💊 Medication #{i}: {drug_name}</h4>
-                                <p><strong>Dosage:</strong> {drug_dosage}</p>
-                            </div>
-                            """, unsafe_allow_html=True)
+                if extracted_drugs:
+                    st.markdown("---")
+                    st.subheader("✅ Extracted Medications")
+                    
+                    for i, drug in enumerate(extracted_drugs, 1):
+                        drug_name = drug.get('name', 'N/A')
+                        drug_dosage = drug.get('dosage', 'Not specified')
                         
-                        # Option to analyze extracted drugs
-                        st.markdown("**🔍 Next Steps**")
-                        if st.button("🚀 Analyze These Medications for Interactions", type="secondary"):
-                            # Store extracted drugs for interaction analysis
-                            st.session_state.interaction_drugs = [
-                                {"name": drug.get('name', ''), "dosage": drug.get('dosage', '')} 
-                                for drug in extracted_drugs
-                            ]
-                            st.success("✅ Medications loaded into Interaction Checker! Switch to the first tab to analyze.")
-                    else:
-                        st.warning("🤔 Could not extract any structured drug information from the text. Try rephrasing or adding more details.")
+                        st.markdown(f"""
+                        <div class="result-card">
+                            <h4>💊 Medication #{i}: {drug_name}</h4>
+                            <p><strong>Dosage:</strong> {drug_dosage}</p>
+                        </div>
+                        """, unsafe_allow_html=True)
+                    
+                    # Option to analyze extracted drugs
+                    st.markdown("**🔍 Next Steps**")
+                    if st.button("🚀 Analyze These Medications for Interactions", type="secondary"):
+                        # Store extracted drugs for interaction analysis
+                        st.session_state.interaction_drugs = [
+                            {"name": drug.get('name', ''), "dosage": drug.get('dosage', '')} 
+                            for drug in extracted_drugs
+                        ]
+                        st.success("✅ Medications loaded into Interaction Checker! Switch to the first tab to analyze.")
                 else:
-                    st.error(f"❌ Extraction Error: {response.text}")
+                    st.warning("🤔 Could not extract any structured drug information from the text. Try rephrasing or adding more details.")
+            except BackendError as e:
+                progress_bar.empty()
+                status_text.empty()
+                st.error(f"❌ Extraction Error: {e}")
             except requests.exceptions.RequestException as e:
                 progress_bar.empty()
                 status_text.empty()
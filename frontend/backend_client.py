@@ -0,0 +1,211 @@
+# frontend/backend_client.py
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- Configuration ---
+BACKEND_URL = "http://127.0.0.1:8000"
+# (connect, read) timeouts in seconds. LLM-backed calls can legitimately take minutes.
+REQUEST_TIMEOUT = (5, 180)
+RESULT_CACHE_SIZE = 256
+RESULT_CACHE_TTL = 600
+# The executor and connection pool are shared by every session, so they are sized to what the
+# backend admits at once (EXTRACTION_MAX_CONCURRENCY + VERIFICATION_MAX_CONCURRENCY, 8 + 16 by
+# default). Beyond that, requests wait in the backend's own queue rather than in this process.
+MAX_CONCURRENT_REQUESTS = 24
+# Mirrors LLM_UNAVAILABLE_MESSAGE in backend/llm_handler.py; results containing it are not cached.
+LLM_UNAVAILABLE_MESSAGE = "An error occurred while communicating with the AI models. Please check the configured LLM providers."
+
+
+class BackendError(Exception):
+    """The backend answered, but not with a usable result."""
+
+
+class _ResultCache:
+    """Thread-safe LRU cache with expiry, shared by every Streamlit session."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self._data.pop(key, None)
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+# --- Resources kept across reruns and sessions ---
+@st.cache_resource
+def get_session():
+    """One pooled HTTP session, so reruns reuse open connections to the backend."""
+    session = requests.Session()
+    # Only failures where the backend cannot have started the work are retried: a read timeout
+    # or a 504 may mean a long LLM call is still running, and resending it multiplies the load.
+    # 503 is deliberately not retried either: the backend sheds load and the user should see it.
+    retries = Retry(
+        total=2, connect=2, read=0, backoff_factor=0.5,
+        status_forcelist=[502], allowed_methods=frozenset(["GET", "POST"])
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=MAX_CONCURRENT_REQUESTS, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def _executor():
+    return ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="backend-client")
+
+@st.cache_resource
+def _result_cache():
+    return _ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+
+def input_hash(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+def _error_detail(response):
+    try:
+        return response.json().get('detail', response.text)
+    except ValueError:
+        return response.text
+
+def _is_cacheable_verification(result):
+    """Partial checks and LLM failures are worth retrying, so they are not cached."""
+    if not result.get('interaction_check_complete', True) or result.get('unresolved_drugs'):
+        return False
+    texts = result.get('dosage_warnings', []) + result.get('alternative_suggestions', [])
+    return not any(LLM_UNAVAILABLE_MESSAGE in text for text in texts)
+
+
+# --- Worker functions. They run on the executor, so they must not call Streamlit APIs. ---
+def _extract(session, cache, text):
+    key = input_hash("extract", text)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = session.post(f"{BACKEND_URL}/extract-from-text/", params={"text": text}, timeout=REQUEST_TIMEOUT)
+    if response.status_code != 200:
+        raise BackendError(_error_detail(response))
+    result = response.json()
+    # An empty list is also what the backend returns when every provider failed.
+    if result:
+        cache.set(key, result)
+    return result
+
+def _verify(session, cache, age, drugs, options, previous):
+    """
+    Verifies a prescription. With a previous result (token and drug entries), only the
+    added and removed drugs are sent; an expired token falls back to a full verification.
+    """
+    key = input_hash("verify", age, drugs, options)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = None
+    if previous:
+        current_entries = [(d['name'], d.get('dosage')) for d in drugs]
+        request_data = {
+            "previous_token": previous["token"],
+            "age": age,
+            "added": [{"name": n, "dosage": dose} for n, dose in current_entries if (n, dose) not in previous["entries"]],
+            "removed": [{"name": n, "dosage": dose} for n, dose in previous["entries"] if (n, dose) not in current_entries],
+            **options
+        }
+        response = session.post(f"{BACKEND_URL}/verify-prescription/incremental/", json=request_data, timeout=REQUEST_TIMEOUT)
+    if response is None or response.status_code == 404:
+        response = session.post(f"{BACKEND_URL}/verify-prescription/", json={"age": age, "drugs": drugs, **options}, timeout=REQUEST_TIMEOUT)
+
+    if response.status_code != 200:
+        raise BackendError(_error_detail(response))
+    result = response.json()
+    if _is_cacheable_verification(result):
+        cache.set(key, result)
+    return result
+
+
+# --- Non-blocking submission ---
+def _submit(job_key, fn, *args):
+    """
+    Starts fn on the executor and remembers the future in st.session_state, so a rerun
+    triggered while the request is in flight picks it up instead of sending it again.
+    """
+    jobs = st.session_state.setdefault("_backend_jobs", {})
+    fingerprint = input_hash(job_key, *args)
+    job = jobs.get(job_key)
+    if job is None or job["fingerprint"] != fingerprint:
+        job = {"fingerprint": fingerprint, "future": _executor().submit(fn, get_session(), _result_cache(), *args)}
+        jobs[job_key] = job
+    return job["future"]
+
+def _finish(job_key):
+    # Not called when a rerun interrupts the wait (Streamlit signals that with a BaseException),
+    # so the in-flight future stays available to the next run.
+    st.session_state.get("_backend_jobs", {}).pop(job_key, None)
+
+def wait_for(future, progress_bar, status_text, message):
+    """Keeps the progress indicators moving while the request runs, then returns its result."""
+    status_text.text(message)
+    progress = 25
+    while not future.done():
+        progress_bar.progress(progress)
+        progress = min(progress + 2, 95)
+        time.sleep(0.1)
+    progress_bar.progress(100)
+    return future.result()
+
+def extract_drugs(text, progress_bar, status_text):
+    future = _submit("extract", _extract, text)
+    try:
+        result = wait_for(future, progress_bar, status_text, "🧠 AI extracting medication data...")
+    except Exception:
+        _finish("extract")
+        raise
+    _finish("extract")
+    return result
+
+def verify_prescription(age, drugs, options, progress_bar, status_text, incremental_key=None):
+    """
+    Verifies a prescription through the cache, incrementally when a previous result for
+    incremental_key is held in st.session_state. Raises BackendError or RequestException.
+    """
+    previous = st.session_state.get(incremental_key) if incremental_key else None
+    job_key = f"verify:{incremental_key or 'single'}"
+    future = _submit(job_key, _verify, age, drugs, options, previous)
+    try:
+        result = wait_for(future, progress_bar, status_text, "🧠 AI analyzing drug interactions...")
+    except Exception as e:
+        _finish(job_key)
+        if incremental_key and isinstance(e, BackendError):
+            st.session_state.pop(incremental_key, None)
+        raise
+    _finish(job_key)
+
+    if incremental_key and result.get('result_token'):
+        st.session_state[incremental_key] = {
+            "token": result['result_token'],
+            "entries": [(d['name'], d.get('dosage')) for d in drugs]
+        }
+    return result